@@ -4,16 +4,23 @@ import json
 from pathlib import Path
 from scripts.asset.build_asset_library import build_asset_library
 from scripts.asset.build_asset_library import build_asset
-from scripts.mubin.get_stats import mubin_stats
-from scripts.mubin.parser import parse_mubin
-from scripts.classes.instance_cache import instance_cache
+from scripts.mubin.get_stats import collect_stats, find_built_assets, write_stats, stats_path
+from scripts.mubin.parser import cache_mubin, init_worker
+from scripts.mubin.cache_manifest import cache_manifest
+from scripts.mubin import mod_index
+from scripts.mubin.actor_filter import actor_filter
+from scripts.mubin.dedup import dedup_caches
+from scripts.mubin.shard_planner import plan_shards, write_shard_manifest
+from scripts.classes.blender_pool import blender_pool
+from scripts.classes.instance_cache import dump_instance_caches
+from scripts.classes.instance_cache import write_instance_cache_binary
 import tkinter as tk
 from tkinter import filedialog
 import sys
 from tqdm import tqdm
-import ujson
 import time
 from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures import as_completed
 
 
@@ -21,7 +28,8 @@ with open("mbconfig.json", "r") as config_load:
     config = json.load(config_load)
     config_load.close()
 
-tk_obj = tk.Tk()
+# created in init_tk, process pool workers re-import this file and shouldn't open a window each
+tk_obj = None
 
 executor = ThreadPoolExecutor()
 
@@ -41,6 +49,7 @@ def install_dependencies():
         'asset_library',
         'asset_library\\assets',
         'asset_library\\mubins_by_prefix',
+        'asset_library\\mubins_by_shard',
         'linked_resources',
         'linked_resources\\json',
         'linked_resources\\json\\generated',
@@ -65,7 +74,8 @@ def install_dependencies():
 
 
 def init_tk():
-    # tk_obj = tk.Tk()
+    global tk_obj
+    tk_obj = tk.Tk()
     tk_obj.geometry('0x0')
     tk_obj.title('tk is only used for file dialog this window should dissapear immediately')
     tk_obj.lower()
@@ -101,46 +111,38 @@ def check_texture_atlas():
     return True
 
 
-def new_stats():
-    print('new stats')
-    from scripts.classes.stats import stats
-    s_cache = stats()
-    for dirpath, dirnames, files in os.walk('asset_library\\assets'):
-        for name in files:
-            if '.blend' in name:
-                s_cache.built_assets[name[:-6]] = True
-    return s_cache
-
-
 def json_pretty_print(ugly):
     print(json.dumps(ugly, sort_keys=True, indent=4))
 
 
 def find_actor(directory, name):
+    from scripts.mubin.search_index import search_index
     name: str = name.strip()
-    stats = new_stats()
-    mubin_paths = mubins_in_directory(directory)
-    for path in mubin_paths:
-        found = mubin_stats(Path(path), True, stats, name)
-        if found:
-            print(path)
-            print(f'Found: {found}')
-    print('Search complete, string found only in mubins listed above')
+    index = search_index.load()
+    # only new or changed mubins get scanned, the first search in a directory builds the index
+    if index.update(directory, mubins_in_directory(directory), config.get("cacheWorkers") or None):
+        index.save()
+    start_time = time.time()
+    hits = index.search(name)
+    sec = time.time() - start_time
+
+    hits_by_mubin = {}
+    for hit in hits:
+        hits_by_mubin.setdefault(hit['mubin'], []).append(hit)
+    for path, mubin_hits in hits_by_mubin.items():
+        print(path)
+        for hit in mubin_hits:
+            location = ', '.join(f'{x:.2f}' for x in hit['location'])
+            print(f'\tFound: {hit["name"]} ({hit["model"]}) HashId: {hit["HashId"]} at [{location}]')
+    print(f'Search complete in {sec} seconds, {len(hits)} placements in {len(hits_by_mubin)} mubins listed above')
 
 
 def get_stats(mubin_paths):
-    stats = new_stats()
-    tqdm_args = {
-        'leave': False,
-        'dynamic_ncols': True,
-        'colour': 'cyan',
-        'position': 1,
-        'desc': 'mubin paths'
-    }
-    for i in tqdm(range(len(mubin_paths)), **tqdm_args):
-        # for i in range(len(mubin_paths)):
-        mubin_path = mubin_paths[i]
-        mubin_stats(Path(mubin_path), True, stats)
+    start_time = time.time()
+    built_assets = find_built_assets('asset_library\\assets')
+    # pure python, mubins are counted in parallel and the per mubin counters merged
+    stats = collect_stats(mubin_paths, built_assets, True, config.get("cacheWorkers") or None)
+    sec = time.time() - start_time
     print('_____________________________________')
     print('\n')
     print('Assets ready to import:')
@@ -156,18 +158,12 @@ def get_stats(mubin_paths):
     json_pretty_print(stats.assets_not_found)
 
     print('_____________________________________')
-    all_assets = dict()
-    all_assets.update(stats.assets_ready)
-    all_assets.update(stats.assets_not_found)
-    all_assets_list = sorted(all_assets, key=all_assets.get)
+    all_assets = stats.all_assets()
     print('\n')
     print('Top 10 common assets')
     print('\n')
-    i = 0
-    while i < 10:
-        asset = all_assets_list.pop()
-        print(asset, all_assets[asset])
-        i += 1
+    for asset, count in stats.top(10):
+        print(asset, count)
 
     print('_____________________________________')
     print('\n')
@@ -175,7 +171,10 @@ def get_stats(mubin_paths):
     print(f'Missing unique assets: {len(stats.assets_not_found)}')
     print(f'Total assets: {sum(all_assets.values())}')
     print(f'Total missing assets: {sum(stats.assets_not_found.values())}')
+    print(f'Actors with no model: {sum(stats.actors_not_found.values())}')
     print('\n')
+    write_stats(stats)
+    print(f'{len(mubin_paths)} mubins counted in {sec:.2f} seconds, saved to {stats_path}')
 
 
 def open_helper(
@@ -260,32 +259,29 @@ def build_mubin_library(directory, quiet=True, timeout=60):
 
     mubins_found = mubins_in_directory(directory)
 
-    # multithreaded caching
-    paths_by_prefix = organize_paths_by_prefix(mubins_found)
-    futures_prefix = [executor.submit(cache_mubins, x, True) for x in paths_by_prefix.values()]
-    for future in as_completed(futures_prefix):
-        res = future.result()
+    # multiprocess caching, then the sections are balanced over one shard per Blender child
+    shard_names = cache_shards(mubins_found)
 
     # multithreaded mubin instancing
-    print(paths_by_prefix.keys())
-    futures_helper = [executor.submit(open_helper, 'import_mubin', [x], timeout, quiet, quiet)
-                      for x in paths_by_prefix.keys()]
+    print(shard_names)
     num_completed = 0
     num_timeout = 0
     tqdm_args = {
-        'total': len(paths_by_prefix.keys()),
+        'total': len(shard_names),
         'leave': False,
         'dynamic_ncols': True,
         'colour': 'green',
-        'desc': 'Grouped mubins imported'
+        'desc': 'Mubin shards imported'
     }
-    for future in tqdm(as_completed(futures_helper), **tqdm_args):
-        # for future in as_completed(futures_helper):
-        res = future.result()
-        if res == 'complete':
-            num_completed += 1
-        else:
-            num_timeout += 1
+    with blender_pool(len(shard_names), quiet) as pool:
+        futures_helper = [pool.submit('import_shard', [x], timeout) for x in shard_names]
+        for future in tqdm(as_completed(futures_helper), **tqdm_args):
+            # for future in as_completed(futures_helper):
+            res = future.result()['status']
+            if res == 'complete':
+                num_completed += 1
+            else:
+                num_timeout += 1
     print(f'\nTotal number of threads completed: {num_completed}')
     print(f'Total number of threads timed out: {num_timeout}')
     end_time = time.time()
@@ -293,36 +289,166 @@ def build_mubin_library(directory, quiet=True, timeout=60):
     print(f'\nCompleted in {sec} seconds.\n')
 
 
-def cache_mubins(mubin_paths: list, by_prefix=True):
+def parse_mubins(mubin_paths: list, workers: int = None, a_filter: actor_filter = None):
+    if workers is None:
+        workers = config.get("cacheWorkers", 0)
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(mubin_paths))
+    if a_filter is None:
+        a_filter = actor_filter.from_config()
+
+    parsed = {}
+    if workers <= 1:
+        for mubin_path in mubin_paths:
+            parsed[mubin_path] = cache_mubin(mubin_path, a_filter)[1]
+        return parsed
+
+    tqdm_args = {
+        'total': len(mubin_paths),
+        'leave': False,
+        'dynamic_ncols': True,
+        'colour': 'yellow',
+        'desc': 'Mubins cached'
+    }
+    # each worker builds the filter once, only the mubin path goes with every job
+    filter_args = (a_filter.spec, a_filter.built_assets)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=filter_args) as pool:
+        futures = {pool.submit(cache_mubin, x): x for x in mubin_paths}
+        for future in tqdm(as_completed(futures), **tqdm_args):
+            parsed[futures[future]] = future.result()[1]
+    return parsed
+
+
+def load_caches(mubin_paths: list, workers: int = None, filter_spec: dict = None) -> dict:
+    """{stem: instance_cache} for every mubin, parsing only the ones that changed since the last run"""
+    # custom actors are resolved from each mod's actorpack index, built once here instead of per worker
+    mod_actors = mod_index.prepare(mubin_paths, workers)
+    # the filter spec comes from mbconfig.json actorFilter unless one is passed in
+    if filter_spec is None:
+        a_filter = actor_filter.from_config()
+    else:
+        a_filter = actor_filter(filter_spec)
+    manifest = cache_manifest.load()
+    manifest.check_sources({'mod_actors': mod_actors, 'filter': a_filter.signature()})
+    stale_paths = manifest.stale_mubins(mubin_paths)
+    print(f'{len(stale_paths)} of {len(mubin_paths)} mubins need caching')
+    parsed = parse_mubins(stale_paths, workers, a_filter)
+    for mubin_path, p_cache in parsed.items():
+        manifest.store(mubin_path, p_cache)
+    manifest.save()
+
+    # merge in the original order so the output matches a single threaded run
     p_caches = {}
     for mubin_path in mubin_paths:
-        p_cache = instance_cache()
-        stem = Path(mubin_path).stem
-        parse_mubin(Path(mubin_path), True, p_cache)
-        if by_prefix:
-            prefix = stem[:3]
-            if prefix not in p_caches:
-                p_caches[prefix] = {}
-            p_caches[prefix][stem] = p_cache
-        else:
-            p_caches[stem] = p_cache
+        p_cache = parsed.get(mubin_path)
+        if p_cache is None:
+            p_cache = manifest.load_mubin(mubin_path)
+        p_caches[Path(mubin_path).stem] = p_cache
+
+    if config.get("dedupPlacements", True):
+        dedup_placements(p_caches)
+    return p_caches
 
+
+def cache_mubins(mubin_paths: list, by_prefix=True, workers: int = None, filter_spec: dict = None):
+    p_caches = load_caches(mubin_paths, workers, filter_spec)
     if by_prefix:
-        for prefix, mubins in p_caches.items():
-            dumpJson = json.loads(json.dumps(mubins, default=lambda o: o.__dict__))
-            with open(f"linked_resources\\json\\generated\\instance_caches\\{prefix}_instance_cache.json", "w") as write_instance_cache:
-                # this can be a very big json (20mb) so using ujson
-                ujson.dump(dumpJson, write_instance_cache)
-                write_instance_cache.close()
-        return p_caches.keys()
+        return write_prefix_caches(p_caches)
+    else:
+        write_instance_caches(p_caches, '')
+
+
+def write_prefix_caches(p_caches: dict):
+    caches_by_prefix = {}
+    for stem, p_cache in p_caches.items():
+        prefix = stem[:3]
+        if prefix not in caches_by_prefix:
+            caches_by_prefix[prefix] = {}
+        caches_by_prefix[prefix][stem] = p_cache
+    for prefix, mubins in caches_by_prefix.items():
+        write_instance_caches(mubins, prefix)
+    return caches_by_prefix.keys()
+
+
+def cache_shards(mubin_paths: list, shard_count: int = None, workers: int = None, filter_spec: dict = None):
+    """caches the mubins into shard_count instance caches of about the same import cost, returns the shard names"""
+    if not shard_count:
+        shard_count = config.get("importShards") or os.cpu_count() or 1
+    p_caches = load_caches(mubin_paths, workers, filter_spec)
+    shards = plan_shards(p_caches, shard_count)
+    for shard in shards:
+        write_instance_caches({stem: p_caches[stem] for stem in shard['mubins']}, shard['name'])
+        print(f'{shard["name"]}: {len(shard["mubins"])} mubins, cost {shard["cost"]:.0f}')
+    write_shard_manifest(shards)
+    # the spatial index and build_required read the prefix caches, not the shards
+    write_prefix_caches(p_caches)
+    return [shard['name'] for shard in shards]
+
+
+def dedup_placements(p_caches: dict):
+    # the per mubin caches stay as parsed, duplicates are only dropped from what gets imported
+    removed = dedup_caches(p_caches)
+    for stem, count in removed.items():
+        if count:
+            print(f'{stem}: removed {count} duplicate placements')
+    print(f'{sum(removed.values())} duplicate placements removed from {len(removed)} mubins')
+    return removed
+
+
+def build_required(mubin_paths: list = None, quiet=True, timeout=60):
+    """builds only the assets the instance caches use, most placed first"""
+    from scripts.asset.build_asset_library import cache_textures
+    from scripts.asset.demand_build import required_models, build_required_assets
+    from scripts.mubin.spatial_index import instance_cache_files
+    cache_textures()
+    import_jobs = []
+    if mubin_paths:
+        cache_mubins(mubin_paths, by_prefix=False)
+        cache_paths = [os.path.abspath('linked_resources\\json\\generated\\instance_caches\\_instance_cache.bin')]
+        # the selected mubins start importing once most of their placements have an asset
+        import_jobs = [['import_mubin', []]]
     else:
-        dumpJson = json.loads(json.dumps(p_caches, default=lambda o: o.__dict__))
-        with open(f"linked_resources\\json\\generated\\instance_caches\\_instance_cache.json", "w") as write_instance_cache:
-            # this can be a very big json (20mb) so using ujson
-            ujson.dump(dumpJson, write_instance_cache)
+        cache_paths = instance_cache_files()
+    if not cache_paths:
+        print('No instance caches found, build the mubin library or select mubins first')
+        return
+    build_required_assets(required_models(cache_paths), quiet, timeout, import_jobs)
+
+
+def write_instance_caches(caches: dict, prefix: str):
+    cache_path = f"linked_resources\\json\\generated\\instance_caches\\{prefix}_instance_cache"
+    write_instance_cache_binary(caches, f'{cache_path}.bin', config.get("instanceCacheCompression", 'none'))
+    # the importer only reads the binary cache, json is for looking at the data
+    if config.get("instanceCacheJson"):
+        with open(f'{cache_path}.json', "w") as write_instance_cache:
+            dump_instance_caches(caches, write_instance_cache)
             write_instance_cache.close()
 
 
+def import_region(x: float = None, z: float = None, radius: float = None):
+    from scripts.mubin.spatial_index import spatial_index, region_cache_prefix
+    if x is None or z is None or radius is None:
+        print('Coordinates are the map coordinates shown on https://objmap.zeldamods.org')
+        try:
+            x = float(input('Center X: '))
+            z = float(input('Center Z: '))
+            radius = float(input('Radius in meters (default 500): ') or 500)
+        except ValueError:
+            return ('not selected', 'No coordinates')
+
+    index = spatial_index.load()
+    start_time = time.time()
+    placements = index.query_radius(x, z, radius)
+    print(f'{len(placements)} placements found in {time.time() - start_time} seconds')
+    if not len(placements):
+        return ('not selected', 'No placements')
+
+    # its own cache, the selected mubins cache is one of the index's sources
+    write_instance_caches(index.batches(placements), region_cache_prefix)
+    open_helper('import_region', timeout_s=60, background=True, quiet=False, launch_file=None)
+
+
 def build_terrain_map():
     number_of_map_data_files = sum([len(files) for _, _, files in os.walk('map_data')])
     # 0 if directory not made
@@ -388,7 +514,15 @@ task_list = [
      'Creates .asset_library\\combined_blends.blend by including instances of the selected blend files by prefix (ex I-7) \
      \nMap: https://objmap.zeldamods.org Enable "show map unit grid" under filter on this site to see the meaning of these prefixes \
      \nWarning, many of these in one file will have worse performance and higher ram usage'},
-    {'task': 'build terrain map', 'desc': 'parses MATE and HGHT data for use in blender'}, ]
+    {'task': 'build terrain map', 'desc': 'parses MATE and HGHT data for use in blender'},
+    {'task': 'import map region',
+     'desc':
+     'Builds a blend file out of every cached placement within a radius of a map coordinate \
+     \nUses the instance caches, so build the mubin library (or import the mubins) first'},
+    {'task': 'build required assets',
+     'desc':
+     'Builds only the assets used by the selected mubins (then imports them) \
+     \nor, if none are selected, by every generated instance cache, most placed assets first'}, ]
 
 
 def print_task_list_info():
@@ -404,8 +538,35 @@ def print_task_list_info():
 
 
 def get_task_list():
-    if 'terrainHybrid' not in config:
-        config['terrainHybrid'] = True
+    defaults = {
+        'terrainHybrid': True,
+        # 0 uses every core
+        'cacheWorkers': 0,
+        # none, zlib or lzma
+        'instanceCacheCompression': 'none',
+        # also write the instance caches as json for debugging
+        'instanceCacheJson': False,
+        # size cap for data_dir\\cache\\yaz0, 0 disables it
+        'yaz0CacheMB': 2048,
+        # which actors get cached, see scripts\\mubin\\actor_filter.py
+        'actorFilter': {'far': 'include', 'include': [], 'exclude': [], 'requireBuiltAsset': False},
+        # drop placements more than one mubin has, by HashId or by model and transform if there's none
+        'dedupPlacements': True,
+        # blender children the map import is split over, 0 uses every core
+        'importShards': 0,
+        # headless Blender workers kept open for asset builds / imports, 0 uses every core
+        'blenderWorkers': 0,
+        # a worker is restarted after this many jobs or once it uses this much memory
+        'blenderWorkerJobs': 50,
+        'blenderWorkerMemoryMB': 6144,
+        # share of placements that need their asset built before an early import starts
+        'importEarlyCoverage': 0.9,
+        # build assets from .npz geometry caches instead of the collada importer
+        'meshCache': False,
+    }
+    if any(key not in config for key in defaults):
+        for key, value in defaults.items():
+            config.setdefault(key, value)
         with open("mbconfig.json", "w") as config_write:
             json.dump(config, config_write, indent=4)
             config_write.close()
@@ -430,6 +591,11 @@ def run_task(task_input):
         # Possibly test one of the larger files to see how long it takes
         #  (DgnObj_DLC_IbutsuEx_BossBattleRoom_A_01)
         build_asset_library(quiet=True, timeout=60)
+    elif 'build required assets' in task:
+        mubin_filetypes = [('mubin', '*.smubin'), ('all', '*.*')]
+        print('Select mubins to build and import, or cancel to use every generated instance cache')
+        mubin_paths = filedialog.askopenfilenames(filetypes=mubin_filetypes)
+        build_required(list(mubin_paths or []))
     elif 'build single asset' in task:
         dae_filetypes = [('collada', '*.dae'), ('all', '*.*')]
         dae_file = filedialog.askopenfilename(filetypes=dae_filetypes)
@@ -468,7 +634,7 @@ def run_task(task_input):
             get_stats(mubin_paths)
     elif 'combine mubin blend libraries' in task:
         blend_filetypes = [('blend', '*.blend'), ('all', '*.*')]
-        initial_dir = 'asset_library\\mubins_by_prefix'
+        initial_dir = 'asset_library\\mubins_by_shard'
         blend_paths = filedialog.askopenfilenames(filetypes=blend_filetypes, initialdir=initial_dir)
         if not blend_paths:
             return ('not selected', 'No paths')
@@ -477,6 +643,8 @@ def run_task(task_input):
         open_helper('combine_blends', arg_list=blend_paths, timeout_s=500, background=True, quiet=False)
     elif 'build terrain' in task:
         build_terrain_map()
+    elif 'import map region' in task:
+        return import_region()
     else:
         print('Command not recognized, back to main menu')
         select_task()
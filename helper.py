@@ -4,6 +4,8 @@ import json
 import os
 import bpy
 import sys
+import time
+import traceback
 import contextlib
 try:
     from tqdm import tqdm
@@ -84,9 +86,94 @@ def import_mubin(argv):
             importer.import_mubin(Path(mubin_path), False, session_cache)
 
 
-def run_importer(prefix):
+def run_importer(prefix, root_name: str = None):
     from scripts.mubin import importer
-    importer.import_all_mubins(prefix)
+    importer.import_all_mubins(prefix, root_name)
+
+
+def import_prefix(prefix: str = ''):
+    save_path = 'asset_library\\'
+    if prefix:
+        save_path += f'mubins_by_prefix\\{prefix}'
+    else:
+        save_path += 'selected_mubins'
+
+    print('running importer')
+    run_importer(prefix)
+    load_override_script()
+    save(f'{save_path}.blend')
+
+
+def import_region():
+    # placements from blender_mubin_tools import_region, written as region_instance_cache.bin
+    from scripts.mubin.spatial_index import region_cache_prefix
+    print('running importer for the map region')
+    run_importer(region_cache_prefix)
+    load_override_script()
+    save(f'asset_library\\{region_cache_prefix}.blend')
+
+
+def import_shard(shard_name: str) -> str:
+    # shards come from scripts\mubin\shard_planner.py, only shards in the current manifest are imported
+    from scripts.mubin.shard_planner import load_shard_manifest, shard_blend_path
+    shard = load_shard_manifest()['shards'].get(shard_name)
+    if not shard:
+        print(f'{shard_name} is not in the shard manifest')
+        return 'error'
+    print(f'running importer for {shard_name}: {len(shard["mubins"])} mubins')
+    # everything goes under a collection named after the shard, that's what combine_mubins links
+    run_importer(shard_name, shard_name)
+    load_override_script()
+    save(shard_blend_path(shard_name))
+    return 'complete'
+
+
+def reset_scene():
+    """back to the starting scene, nothing from the previous job is left in the file"""
+    launch_file = os.path.abspath('starting_scene\\starting_scene.blend')
+    if os.path.isfile(launch_file):
+        bpy.ops.wm.open_mainfile(filepath=launch_file)
+    else:
+        bpy.ops.wm.read_factory_settings(use_empty=False)
+
+
+def run_job(func_to_run: str, argv: list) -> str:
+    if func_to_run == 'build_asset':
+        from scripts.asset import build_asset
+        return build_asset.build(argv[0], '--rebuild' in argv[1:])
+    elif func_to_run == 'import_mubin':
+        import_prefix(argv[0][:3] if argv else '')
+    elif func_to_run == 'import_shard':
+        return import_shard(argv[0])
+    else:
+        print(f'{func_to_run} is not a worker job')
+        return 'error'
+    return 'complete'
+
+
+def worker():
+    # jobs are json lines on stdin, see scripts\classes\blender_pool.py
+    from scripts.classes.blender_pool import send_message, process_memory_mb
+    send_message({'id': 'ready', 'status': 'ready', 'memory_mb': process_memory_mb()})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        if job.get('func') == 'quit':
+            break
+        start_time = time.time()
+        try:
+            reset_scene()
+            status = run_job(job['func'], job.get('args', []))
+        except Exception:
+            print(f'{job} failed\n{traceback.format_exc()}')
+            status = 'error'
+        send_message({
+            'id': job['id'],
+            'status': status,
+            'seconds': time.time() - start_time,
+            'memory_mb': process_memory_mb(),
+        })
 
 
 def main():
@@ -110,14 +197,13 @@ def main():
                 # import_mubin(argv)
                 # save_path += Path(argv[1]).stem[:3]
                 prefix = argv[1][:3]
-                save_path += f'mubins_by_prefix\\{prefix}'
-            else:
-                save_path += 'selected_mubins'
-
-            print('running importer')
-            run_importer(prefix)
-            load_override_script()
-            save(f'{save_path}.blend')
+            import_prefix(prefix)
+        elif func_to_run == 'import_shard':
+            import_shard(argv[1])
+        elif func_to_run == 'import_region':
+            import_region()
+        elif func_to_run == 'worker':
+            worker()
         elif func_to_run == 'combine_blends':
             from scripts.asset.combine_blend_files import combine_mubins
             combine_mubins(argv[1:])
@@ -13,6 +13,7 @@ sys.path.append('.')
 # auto formatting this file will move these above sys.path.append, breaking the script
 from scripts.asset import shader_fixer
 from scripts.asset import dae_fixer
+from scripts.asset import mesh_builder
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
@@ -88,11 +89,58 @@ def bmesh_cleanup():
         bm.from_mesh(object_data)
         # remove duplicate vertices
         bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=.005)
-        bm.to_mesh(object_data)
         # remove all loose vertices
         loose_verts = [v for v in bm.verts if not v.link_faces]
         for v in loose_verts:
             bm.verts.remove(v)
+        bm.to_mesh(object_data)
+        bm.free()
+
+
+def build(asset_path: str, rebuild: bool = False) -> str:
+    """builds one collada asset into asset_library\\assets, expects a clean scene"""
+    dae_name = Path(asset_path).stem
+    save_path = base_path+'\\'+dae_name+'.blend'
+    if os.path.isfile(save_path) and not rebuild:
+        print(f'{dae_name} already built')
+        return 'already built'
+    clean_file()
+
+    new_dae_file_path = dae_fixer.get_new_dae_path(asset_path)
+
+    # build_asset_library fixes the daes before Blender starts, this only covers single builds
+    if dae_fixer.needs_fix(asset_path):
+        new_dae_file_path = dae_fixer.fix_dae(asset_path)
+    # new_dae_file_path = dae_fixer.fix_dae(asset_path)
+    default_collection = bpy.data.collections.get('Collection')
+    if not default_collection:
+        default_collection = bpy.data.collections.new('Collection')
+        bpy.context.scene.collection.children.link(default_collection)
+        vl_collections = bpy.context.scene.view_layers["ViewLayer"].layer_collection
+        default_layer_collection = vl_collections.children.get('Collection')
+        bpy.context.view_layer.active_layer_collection = default_layer_collection
+
+    # the geometry cache skips the collada importer, anything it can't build still goes through it
+    from_cache = config.get("meshCache") and mesh_builder.build_from_cache(asset_path)
+    if not from_cache:
+        import_dae(str(new_dae_file_path))
+    shader_fixer.fix_shaders(dae_name)
+    set_shading_type()
+    # the geometry cache is already welded and has no loose vertices
+    if not from_cache:
+        bmesh_cleanup()
+    armature = bpy.data.objects["Armature"]
+    armature.name = dae_name
+    root_bone = armature.pose.bones.get("Root")
+    if root_bone:
+        root_bone.rotation_mode = 'XYZ'
+    if default_collection:
+        default_collection.name = dae_name
+    else:
+        print('Default collection not found, cannot rename')
+    print(dae_name)
+    save(save_path)
+    return 'complete'
 
 
 def main():
@@ -105,42 +153,7 @@ def main():
     # example arg
     # TwnObj_Village_Hateno_A-51\TwnObj_Village_HatenoHouse_A_L_02.dae
     if argv and argv[0]:
-        asset_path = argv[0]
-        dae_name = Path(asset_path).stem
-        save_path = base_path+'\\'+dae_name+'.blend'
-        if os.path.isfile(save_path):
-            print(f'{dae_name} already built')
-            return
-        clean_file()
-
-        new_dae_file_path = dae_fixer.get_new_dae_path(asset_path)
-
-        if not new_dae_file_path.is_file():
-            new_dae_file_path = dae_fixer.fix_dae(asset_path)
-        # new_dae_file_path = dae_fixer.fix_dae(asset_path)
-        default_collection = bpy.data.collections.get('Collection')
-        if not default_collection:
-            default_collection = bpy.data.collections.new('Collection')
-            bpy.context.scene.collection.children.link(default_collection)
-            vl_collections = bpy.context.scene.view_layers["ViewLayer"].layer_collection
-            default_layer_collection = vl_collections.children.get('Collection')
-            bpy.context.view_layer.active_layer_collection = default_layer_collection
-
-        import_dae(str(new_dae_file_path))
-        shader_fixer.fix_shaders(dae_name)
-        set_shading_type()
-        bmesh_cleanup()
-        armature = bpy.data.objects["Armature"]
-        armature.name = dae_name
-        root_bone = armature.pose.bones.get("Root")
-        if root_bone:
-            root_bone.rotation_mode = 'XYZ'
-        if default_collection:
-            default_collection.name = dae_name
-        else:
-            print('Default collection not found, cannot rename')
-        print(dae_name)
-        save(save_path)
+        build(argv[0], '--rebuild' in argv[1:])
     else:
         print('build_asset cannot build_asset without an asset to build')
     return
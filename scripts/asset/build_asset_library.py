@@ -7,6 +7,11 @@ import os
 import sys
 from pathlib import Path
 from tqdm import tqdm
+from scripts.classes.blender_pool import blender_pool
+from scripts.asset.build_scheduler import build_history
+from scripts.asset.build_manifest import build_manifest
+from scripts.asset.dae_preprocess import preprocess_daes
+from scripts.asset.material_rules import material_rules
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
@@ -36,11 +41,19 @@ def walk_textures():
     return tx
 
 
+def write_if_changed(path, text):
+    # an unchanged file keeps its mtime, so the material rules snapshot isn't recompiled for nothing
+    path = Path(path)
+    if path.is_file() and path.read_text() == text:
+        return
+    path.write_text(text)
+
+
 def cache_textures():
     tx: textures = walk_textures()
-    Path(f'linked_resources\\json\\generated\\normals.json').write_text(json.dumps(tx.normals, indent=4))
-    Path(f'linked_resources\\json\\generated\\masks.json').write_text(json.dumps(tx.masks, indent=4))
-    Path(f'linked_resources\\json\\generated\\trs.json').write_text(json.dumps(tx.trs, indent=4))
+    write_if_changed(f'linked_resources\\json\\generated\\normals.json', json.dumps(tx.normals, indent=4))
+    write_if_changed(f'linked_resources\\json\\generated\\masks.json', json.dumps(tx.masks, indent=4))
+    write_if_changed(f'linked_resources\\json\\generated\\trs.json', json.dumps(tx.trs, indent=4))
 
 
 def build_asset(dae_path, quiet=True, background=True, timeout_s=30):
@@ -88,23 +101,13 @@ def build_asset(dae_path, quiet=True, background=True, timeout_s=30):
     return 'complete'
 
 
-def assets_to_build_flawed():
-    built_assets = []
-    for dirpath, dirnames, files in os.walk('asset_library\\assets'):
-        for name in files:
-            if '.blend' in name:
-                built_assets += [name[:-6]]
-
-    unbuilt_assets = []
+def dae_paths():
+    paths = []
     for dirpath, dirnames, files in os.walk(config["colladaPath"]):
-        local_path = dirpath.split('collada')[1][1:]
         for name in files:
-            if '.dae' in name:
-                if name[:-4] not in built_assets:
-                    dae_file_path = os.path.abspath(os.path.join(dirpath, name))
-                    unbuilt_assets += [dae_file_path]
-                    print(f"{name} not built")
-    return unbuilt_assets
+            if name.endswith('.dae'):
+                paths += [os.path.abspath(os.path.join(dirpath, name))]
+    return paths
 
 
 def all_dae_files():
@@ -118,11 +121,34 @@ def all_dae_files():
     return unbuilt_assets
 
 
+def run_builds(pool: blender_pool, history: build_history, assets: list, min_timeout, tqdm_args) -> dict:
+    futures = {}
+    for x in assets:
+        # stale blends are rebuilt in place rather than skipped as already built
+        futures[pool.submit('build_asset', [x, '--rebuild'], history.timeout(x, min_timeout))] = x
+    results = {}
+    # for future in as_completed(futures):
+    for future in tqdm(as_completed(futures), **tqdm_args):
+        # retrieve the result
+        res = future.result()
+        history.record(futures[future], res)
+        results[futures[future]] = res
+    return results
+
+
 def build_asset_library(quiet=True, timeout=60):
     start_time = time.time()
     print("Building asset library")
     cache_textures()
-    assets_to_build = assets_to_build_flawed()
+    # only assets whose dae, textures, json entries, linked.blend or builder scripts changed
+    manifest = build_manifest.load()
+    assets_to_build = manifest.stale_assets(dae_paths())
+    manifest.save()
+    print(f'{len(assets_to_build)} assets to build')
+    # shader_fixer reads each asset's material entries from this instead of all the json
+    material_rules.prepare(manifest.assets)
+    # dae fixing and geometry extraction don't need Blender, do them on every core before Blender takes them
+    preprocess_daes(assets_to_build, config.get("cacheWorkers") or None)
     # quiet = False
     # assets_to_build = assets_to_build[:1]
 
@@ -133,7 +159,6 @@ def build_asset_library(quiet=True, timeout=60):
         json.dump(missing_shaders, f, indent=4)
         f.close()
 
-    futures = [executor.submit(build_asset, x, quiet, True, timeout) for x in assets_to_build]
     num_completed = 0
     num_timeout = 0
 
@@ -145,14 +170,28 @@ def build_asset_library(quiet=True, timeout=60):
         'desc': 'Assets Built'
     }
 
-    # for future in as_completed(futures):
-    for future in tqdm(as_completed(futures), **tqdm_args):
-        # retrieve the result
-        res = future.result()
-        if res == 'complete':
+    # slowest assets first, each with a timeout from how long it took last time
+    history = build_history.load()
+    assets_to_build = history.order(assets_to_build)
+
+    # long lived Blender workers, each asset only costs a scene reset instead of a Blender startup
+    with blender_pool(quiet=quiet) as pool:
+        results = run_builds(pool, history, assets_to_build, timeout, tqdm_args)
+        timed_out = [x for x, res in results.items() if res['status'] == 'timeout']
+        if timed_out:
+            print(f'\nRetrying {len(timed_out)} timed out assets with a larger budget')
+            tqdm_args['total'] = len(timed_out)
+            tqdm_args['desc'] = 'Assets Retried'
+            results.update(run_builds(pool, history, timed_out, timeout, tqdm_args))
+    history.save()
+
+    for x, res in results.items():
+        if res['status'] in ('complete', 'already built'):
+            manifest.record_built(x)
             num_completed += 1
         else:
             num_timeout += 1
+    manifest.save()
     print(f'\nTotal number of threads completed: {num_completed}')
     print(f'Total number of threads timed out: {num_timeout}')
     end_time = time.time()
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from scripts.mubin.cache_manifest import file_entry
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+manifest_path = 'linked_resources\\json\\generated\\build_manifest.json'
+MANIFEST_VERSION = 1
+REFERENCES_VERSION = 2
+"""bumped when dae_references changes, an unchanged dae is rescanned once instead of every asset rebuilding"""
+
+builder_sources = [
+    'scripts\\asset\\shader_fixer.py',
+    'scripts\\asset\\build_asset.py',
+    'scripts\\asset\\dae_fixer.py',
+    'scripts\\asset\\collada_geometry.py',
+    'scripts\\asset\\mesh_builder.py',
+    'scripts\\asset\\material_rules.py',
+]
+"""anything that changes what gets written to the blend"""
+linked_blend_path = 'linked_resources\\linked.blend'
+json_sources = {
+    'assets_info': 'linked_resources\\json\\assets_info.json',
+    'sensible_defaults': 'linked_resources\\json\\sensible_defaults.json',
+    'terrainmat_names': 'linked_resources\\json\\terrainmat_names.json',
+}
+# shader_fixer looks for these next to every <name>Alb.png
+texture_variants = ['Alb.png', 'Nrm.png', 'Msk.png', 'Trs.png']
+
+init_from_pattern = re.compile(r'<init_from>([^<]*)</init_from>')
+material_pattern = re.compile(r'<material\b([^>]*)>')
+name_attribute = re.compile(r'\bname="([^"]*)"')
+id_attribute = re.compile(r'\bid="([^"]*)"')
+
+
+def material_name(attributes: str) -> str:
+    # blender's collada importer names a material by its id when it has no name
+    match = name_attribute.search(attributes) or id_attribute.search(attributes)
+    return match.group(1) if match else None
+
+
+def dae_references(dae_path) -> tuple:
+    """(image file names, material names) the dae uses"""
+    text = Path(dae_path).read_text(errors='ignore')
+    images = sorted({re.split(r'[\\/]', x.strip())[-1] for x in init_from_pattern.findall(text) if x.strip()})
+    materials = sorted({material_name(x) for x in material_pattern.findall(text)} - {None})
+    return images, materials
+
+
+def digest(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class build_manifest:
+    """
+    Hashes of everything an asset's blend is built from, so a rebuild only touches assets whose inputs changed:
+    the dae, the textures it references, its assets_info / sensible_defaults / terrainmat_names entries,
+    linked.blend and the builder scripts themselves.
+    """
+
+    def __init__(self):
+        self.assets: dict = {}
+        """dae name: dae entry, images, materials and the inputs hash it was built from"""
+        self.files: dict = {}
+        """path: size, mtime, hash, so unchanged textures aren't hashed again"""
+        self.json_data: dict = {}
+        self.pending: dict = {}
+        """dae name: inputs hash, recorded once the build completes"""
+
+    def load():
+        manifest = build_manifest()
+        if Path(manifest_path).is_file():
+            try:
+                data = json.loads(Path(manifest_path).read_text())
+                if data.get('version') == MANIFEST_VERSION:
+                    manifest.assets = data['assets']
+                    manifest.files = data['files']
+            except Exception:
+                print('build manifest unreadable, checking every asset')
+        for name, path in json_sources.items():
+            manifest.json_data[name] = json.loads(Path(path).read_text()) if Path(path).is_file() else {}
+        return manifest
+
+    def save(self):
+        data = {'version': MANIFEST_VERSION, 'assets': self.assets, 'files': self.files}
+        Path(manifest_path).write_text(json.dumps(data))
+
+    def file_hash(self, path) -> str:
+        path = os.path.abspath(path)
+        entry = file_entry(path, self.files.get(path))
+        self.files[path] = entry
+        return entry and entry['hash']
+
+    def builder_version(self) -> str:
+        return digest(
+            [self.file_hash(path) for path in builder_sources],
+            self.file_hash(linked_blend_path),
+            bool(config.get("meshCache")),
+        )
+
+    def references(self, dae_path) -> dict:
+        """the asset's entry, the dae is only rescanned for references if it changed"""
+        name = Path(dae_path).stem
+        previous = self.assets.get(name, {})
+        dae = file_entry(dae_path, previous.get('dae'))
+        scanned = previous.get('references_version') == REFERENCES_VERSION
+        if previous.get('dae') and dae and previous['dae'].get('hash') == dae['hash'] and scanned:
+            previous['dae'] = dae
+            return previous
+        images, materials = dae_references(dae_path)
+        entry = {
+            'dae': dae,
+            'images': images,
+            'materials': materials,
+            'references_version': REFERENCES_VERSION,
+            'built': previous.get('built'),
+        }
+        self.assets[name] = entry
+        return entry
+
+    def inputs_hash(self, dae_path, builder_version: str) -> str:
+        name = Path(dae_path).stem
+        entry = self.references(dae_path)
+        textures_path = os.path.abspath(config['texturesPath'])
+        textures = {}
+        terrain = {}
+        for image in entry['images']:
+            textures[image] = self.file_hash(f'{textures_path}\\{image}')
+            if image.endswith('Alb.png'):
+                image_stem = image[:-7]
+                for variant in texture_variants:
+                    textures[image_stem + variant] = self.file_hash(f'{textures_path}\\{image_stem}{variant}')
+                terrain[image_stem] = self.json_data['terrainmat_names'].get(image_stem)
+        defaults = {m: self.json_data['sensible_defaults'].get(m.lower()) for m in entry['materials']}
+        return digest(
+            entry['dae']['hash'],
+            textures,
+            terrain,
+            self.json_data['assets_info'].get(name),
+            defaults,
+            builder_version,
+        )
+
+    def stale_assets(self, dae_paths: list) -> list:
+        """the dae paths whose blend is missing or was built from different inputs"""
+        builder_version = self.builder_version()
+        stale = []
+        for dae_path in dae_paths:
+            name = Path(dae_path).stem
+            inputs = self.inputs_hash(dae_path, builder_version)
+            blend_path = Path(f'asset_library\\assets\\{name}.blend')
+            if blend_path.is_file() and self.assets[name].get('built') is None:
+                # built before there was a manifest, trust it rather than rebuilding the whole library
+                self.assets[name]['built'] = inputs
+            if not blend_path.is_file() or self.assets[name].get('built') != inputs:
+                self.pending[name] = inputs
+                stale.append(dae_path)
+        return stale
+
+    def record_built(self, dae_path):
+        name = Path(dae_path).stem
+        if name in self.pending and name in self.assets:
+            self.assets[name]['built'] = self.pending.pop(name)
@@ -0,0 +1,103 @@
+import os
+import json
+from pathlib import Path
+
+history_path = 'linked_resources\\json\\generated\\build_history.json'
+HISTORY_VERSION = 1
+
+# size model used until there's enough history to fit one
+BASE_SECONDS = 5.0
+SECONDS_PER_MB = 4.0
+MIN_FIT_SAMPLES = 8
+
+TIMEOUT_FACTOR = 2.0
+"""a build gets this many times its estimate before it counts as stuck"""
+TIMEOUT_PADDING = 15.0
+RETRY_FACTOR = 3.0
+"""budget multiplier for an asset that timed out before"""
+SMOOTHING = 0.5
+
+
+def dae_size_mb(dae_path) -> float:
+    try:
+        return os.path.getsize(dae_path) / (1024 * 1024)
+    except OSError:
+        return 0.0
+
+
+class build_history:
+    """
+    How long each asset took to build last time, so a rebuild can start the slow ones first
+    and give every asset a timeout that fits it instead of one fixed budget.
+    """
+
+    def __init__(self):
+        self.assets: dict = {}
+        """dae name: seconds, size_mb, status"""
+        self.model = (BASE_SECONDS, SECONDS_PER_MB)
+        """base seconds, seconds per mb of dae"""
+
+    def load():
+        history = build_history()
+        if Path(history_path).is_file():
+            try:
+                data = json.loads(Path(history_path).read_text())
+                if data.get('version') == HISTORY_VERSION:
+                    history.assets = data['assets']
+            except Exception:
+                print('build history unreadable, starting over')
+        history.fit()
+        return history
+
+    def save(self):
+        Path(history_path).write_text(json.dumps({'version': HISTORY_VERSION, 'assets': self.assets}, indent=4))
+
+    def fit(self):
+        """least squares seconds = base + per_mb * size over every asset that built"""
+        samples = [(a['size_mb'], a['seconds']) for a in self.assets.values() if a.get('status') == 'complete']
+        if len(samples) < MIN_FIT_SAMPLES:
+            self.model = (BASE_SECONDS, SECONDS_PER_MB)
+            return
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+        if var_x <= 0:
+            self.model = (mean_y, 0.0)
+            return
+        per_mb = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+        per_mb = max(per_mb, 0.0)
+        self.model = (max(mean_y - per_mb * mean_x, 0.0), per_mb)
+
+    def estimate(self, dae_path) -> float:
+        """expected build seconds, from the last build if there was one, otherwise from the dae size"""
+        size_mb = dae_size_mb(dae_path)
+        entry = self.assets.get(Path(dae_path).stem)
+        if entry and entry.get('size_mb') == size_mb:
+            if entry.get('status') == 'complete':
+                return entry['seconds']
+            if entry.get('status') == 'timeout':
+                # it never finished, all we know is it needs more than it got
+                return entry['seconds'] * RETRY_FACTOR / TIMEOUT_FACTOR
+        base, per_mb = self.model
+        return base + per_mb * size_mb
+
+    def timeout(self, dae_path, min_timeout: float) -> float:
+        # once a timeout is recorded the estimate grows, so a retry automatically gets a larger budget
+        return max(min_timeout, self.estimate(dae_path) * TIMEOUT_FACTOR + TIMEOUT_PADDING)
+
+    def order(self, dae_paths: list) -> list:
+        """longest first, the big assets start right away instead of holding up the tail"""
+        return sorted(dae_paths, key=self.estimate, reverse=True)
+
+    def record(self, dae_path, result: dict):
+        status = result.get('status')
+        if status not in ('complete', 'timeout'):
+            return
+        name = Path(dae_path).stem
+        seconds = float(result.get('seconds') or 0)
+        previous = self.assets.get(name)
+        if status == 'complete' and previous and previous.get('status') == 'complete':
+            # smooth out a slow run from a busy machine
+            seconds = SMOOTHING * seconds + (1 - SMOOTHING) * previous['seconds']
+        self.assets[name] = {'seconds': seconds, 'size_mb': dae_size_mb(dae_path), 'status': status}
@@ -0,0 +1,511 @@
+import os
+import json
+import math
+import urllib.parse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+import numpy as np
+from scripts.asset import dae_fixer
+
+GEOMETRY_VERSION = 2
+# bmesh remove_doubles distance the asset build used
+WELD_DISTANCE = .005
+# blender's collada importer labels the image nodes after the channel, shader_fixer finds them by these labels
+image_labels = {
+    'diffuse': 'Base Color',
+    'specular': 'Specular',
+    'emission': 'Emission',
+}
+
+
+def get_geometry_path(dae_file_path) -> Path:
+    """the geometry cache sits next to the fixed dae in collada_parsed"""
+    return dae_fixer.get_new_dae_path(dae_file_path).with_suffix('.npz')
+
+
+def needs_extract(dae_file_path) -> bool:
+    """the geometry cache is missing, or older than its dae or this script"""
+    geometry_path = get_geometry_path(dae_file_path)
+    if not geometry_path.is_file():
+        return True
+    cache_mtime = geometry_path.stat().st_mtime_ns
+    return cache_mtime < os.stat(dae_file_path).st_mtime_ns or cache_mtime < os.stat(__file__).st_mtime_ns
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_floats(text) -> np.ndarray:
+    return np.array((text or '').split(), dtype=np.float64)
+
+
+def parse_ints(text) -> np.ndarray:
+    return np.array((text or '').split(), dtype=np.int64)
+
+
+def rotation_matrix(axis, degrees) -> np.ndarray:
+    x, y, z = np.asarray(axis, dtype=np.float64) / (np.linalg.norm(axis) or 1)
+    c = math.cos(math.radians(degrees))
+    s = math.sin(math.radians(degrees))
+    t = 1 - c
+    matrix = np.identity(4)
+    matrix[:3, :3] = [
+        [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+    ]
+    return matrix
+
+
+def weld_vertices(positions: np.ndarray, distance: float = WELD_DISTANCE) -> tuple:
+    """
+    (first vertex of each cell, vertex: cell) with the vertices snapped to a grid of the weld distance.
+    like remove_doubles the first vertex found keeps its position, the others are merged into it
+    """
+    if not len(positions):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    grid = np.floor(positions / distance + .5).astype(np.int64)
+    grid -= grid.min(axis=0)
+    spans = grid.max(axis=0) + 1
+    if np.prod(spans.astype(np.float64)) < 2 ** 62:
+        # pack the three cell coordinates into one key, much faster to unique than rows
+        keys = (grid[:, 0] * spans[1] + grid[:, 1]) * spans[2] + grid[:, 2]
+        _, first, cells = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, cells = np.unique(grid, axis=0, return_index=True, return_inverse=True)
+    # number the cells in the order their first vertex appears so the vertex order is kept
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[cells.reshape(-1)]
+
+
+def clean_mesh(arrays: dict, distance: float = WELD_DISTANCE):
+    """
+    welds the mesh's vertices, then drops the faces that collapsed onto a repeated vertex and
+    the vertices no face uses, so Blender gets a mesh that doesn't need a bmesh cleanup
+    """
+    first, cells = weld_vertices(arrays['positions'], distance)
+    loops = cells[arrays['loops']]
+    sizes = arrays['sizes']
+
+    # a face is degenerate if it has fewer than 3 corners or uses a vertex twice
+    face_ids = np.repeat(np.arange(len(sizes)), sizes)
+    keys = np.sort(face_ids * max(len(first), 1) + loops)
+    degenerate = sizes < 3
+    degenerate[keys[1:][keys[1:] == keys[:-1]] // max(len(first), 1)] = True
+    keep_faces = ~degenerate
+    keep_loops = keep_faces[face_ids]
+    loops = loops[keep_loops]
+
+    # reindex so only the vertices the remaining faces use are kept
+    used = np.zeros(len(first), dtype=bool)
+    used[loops] = True
+    new_index = np.cumsum(used) - 1
+    arrays['positions'] = np.ascontiguousarray(arrays['positions'][first[used]])
+    arrays['loops'] = new_index[loops].astype(np.int32)
+    for name in list(arrays):
+        if name in ('normals',) or name.startswith('uv') or name.startswith('color'):
+            arrays[name] = arrays[name][keep_loops]
+    arrays['sizes'] = sizes[keep_faces]
+    arrays['materials'] = arrays['materials'][keep_faces]
+
+    if 'weights' in arrays:
+        # merged vertices take the weights of the vertex they were merged into
+        vertex_ids = arrays['weight_vertices']
+        vertex_cells = cells[np.minimum(vertex_ids, max(len(cells) - 1, 0))]
+        keep = (vertex_ids < len(cells)) & (first[vertex_cells] == vertex_ids) & used[vertex_cells]
+        arrays['weight_vertices'] = new_index[vertex_cells[keep]].astype(np.int32)
+        arrays['weight_groups'] = arrays['weight_groups'][keep]
+        arrays['weights'] = arrays['weights'][keep]
+
+
+class collada_document:
+    """
+    Reads the geometry, skeleton and materials out of a collada file into numpy arrays.
+
+    Only what the asset build uses is read: triangles, polylist and polygons primitives,
+    one skin per controller and the diffuse / specular / emission images of each effect.
+    """
+
+    def __init__(self, dae_path):
+        self.dae_path = dae_path
+        self.root = ET.parse(dae_path).getroot()
+        self.ns = self.root.tag[:self.root.tag.index('}') + 1] if self.root.tag.startswith('{') else ''
+        self.ids = {el.get('id'): el for el in self.root.iter() if el.get('id')}
+        self.sources: dict = {}
+        """source id: (n, stride) array"""
+
+        self.materials: list = []
+        self.material_lookup: dict = {}
+        """material id: index in materials"""
+        self.joints: list = []
+        self.joint_lookup: dict = {}
+        """joint sid, name and id: index in joints"""
+        self.meshes: list = []
+        self.mesh_lookup: dict = {}
+        """(geometry id, controller id): index in meshes"""
+        self.objects: list = []
+        self.arrays: dict = {}
+
+    def q(self, path: str) -> str:
+        return '/'.join(self.ns + part for part in path.split('/'))
+
+    def by_url(self, url):
+        if not url:
+            return None
+        return self.ids.get(url.lstrip('#'))
+
+    def source_array(self, url) -> np.ndarray:
+        if url in self.sources:
+            return self.sources[url]
+        source = self.by_url(url)
+        if source is None:
+            raise ValueError(f'source {url} not found')
+        float_array = source.find(self.q('float_array'))
+        values = parse_floats(float_array.text if float_array is not None else '')
+        accessor = source.find(self.q('technique_common/accessor'))
+        stride = int(accessor.get('stride', 1)) if accessor is not None else 1
+        array = values[:len(values) // stride * stride].reshape(-1, stride).astype(np.float32)
+        self.sources[url] = array
+        return array
+
+    def source_names(self, url) -> list:
+        source = self.by_url(url)
+        if source is None:
+            raise ValueError(f'source {url} not found')
+        for tag in ('Name_array', 'IDREF_array'):
+            names = source.find(self.q(tag))
+            if names is not None:
+                return (names.text or '').split()
+        return []
+
+    def up_axis(self) -> str:
+        return (self.root.findtext(self.q('asset/up_axis')) or 'Y_UP').strip()
+
+    def node_matrix(self, node) -> np.ndarray:
+        matrix = np.identity(4)
+        for child in node:
+            tag = local_name(child.tag)
+            if tag == 'matrix':
+                transform = parse_floats(child.text).reshape(4, 4)
+            elif tag == 'translate':
+                transform = np.identity(4)
+                transform[:3, 3] = parse_floats(child.text)
+            elif tag == 'rotate':
+                values = parse_floats(child.text)
+                transform = rotation_matrix(values[:3], values[3])
+            elif tag == 'scale':
+                transform = np.diag(np.append(parse_floats(child.text), 1))
+            else:
+                continue
+            matrix = matrix @ transform
+        return matrix
+
+    def image_file(self, image_id):
+        image = self.by_url(image_id)
+        if image is None:
+            return None
+        # 1.4 has the path straight in init_from, 1.5 wraps it in ref
+        path = image.findtext(self.q('init_from/ref')) or image.findtext(self.q('init_from'))
+        if not path:
+            return None
+        path = urllib.parse.unquote(path.strip())
+        if path.startswith('file:///'):
+            path = path[8:]
+        elif path.startswith('file://'):
+            path = path[7:]
+        return path
+
+    def effect_images(self, effect) -> dict:
+        """image node label: image file for the channels shader_fixer wires up"""
+        params = {p.get('sid'): p for p in effect.iter(self.ns + 'newparam')}
+        images = {}
+        for channel, label in image_labels.items():
+            texture = effect.find(f'.//{self.ns}{channel}/{self.ns}texture')
+            if texture is None:
+                continue
+            # texture points at a sampler, the sampler at a surface, the surface at the image
+            name = texture.get('texture')
+            for _ in range(3):
+                param = params.get(name)
+                if param is None:
+                    break
+                name = (param.findtext(self.q('sampler2D/source')) or
+                        param.findtext(self.q('surface/init_from')) or '').strip()
+                instance_image = param.find(self.q('sampler2D/instance_image'))
+                if instance_image is not None:
+                    name = instance_image.get('url', '').lstrip('#')
+            image_file = self.image_file(name)
+            if image_file:
+                images[label] = image_file
+        return images
+
+    def material_index(self, url) -> int:
+        material = self.by_url(url)
+        if material is None:
+            return -1
+        material_id = material.get('id')
+        if material_id in self.material_lookup:
+            return self.material_lookup[material_id]
+        instance_effect = material.find(self.q('instance_effect'))
+        effect = self.by_url(instance_effect.get('url')) if instance_effect is not None else None
+        self.material_lookup[material_id] = len(self.materials)
+        self.materials.append({
+            'name': material.get('name') or material_id,
+            'images': self.effect_images(effect) if effect is not None else {},
+        })
+        return self.material_lookup[material_id]
+
+    def read_primitive(self, primitive, vertex_inputs: dict) -> dict:
+        tag = local_name(primitive.tag)
+        inputs = primitive.findall(self.q('input'))
+        stride = max((int(i.get('offset', 0)) for i in inputs), default=0) + 1
+        if tag == 'polygons':
+            polygons = [parse_ints(p.text) for p in primitive.findall(self.q('p'))]
+            sizes = np.array([len(p) // stride for p in polygons], dtype=np.int32)
+            indices = np.concatenate(polygons) if polygons else np.empty(0, dtype=np.int64)
+        else:
+            indices = parse_ints(primitive.findtext(self.q('p')))
+            if tag == 'triangles':
+                sizes = np.full(len(indices) // (stride * 3), 3, dtype=np.int32)
+            else:
+                sizes = parse_ints(primitive.findtext(self.q('vcount'))).astype(np.int32)
+        indices = indices[:len(indices) // stride * stride].reshape(-1, stride)
+
+        result = {'sizes': sizes, 'normals': None, 'uvs': [], 'colors': [], 'symbol': primitive.get('material') or ''}
+        channels = []
+        for i, primitive_input in enumerate(inputs):
+            semantic = primitive_input.get('semantic')
+            column = indices[:, int(primitive_input.get('offset', 0))]
+            if semantic == 'VERTEX':
+                result['loops'] = column.astype(np.int32)
+                # normals, uvs etc. on <vertices> share the vertex index
+                for vertex_semantic, (vertex_source, vertex_set) in vertex_inputs.items():
+                    if vertex_semantic != 'POSITION':
+                        channels.append((vertex_semantic, vertex_set, self.source_array(vertex_source)[column]))
+            else:
+                input_set = int(primitive_input.get('set', i))
+                channels.append((semantic, input_set, self.source_array(primitive_input.get('source'))[column]))
+        if 'loops' not in result:
+            raise ValueError(f'{tag} in {self.dae_path} has no VERTEX input')
+
+        for semantic, input_set, values in sorted(channels, key=lambda c: c[1]):
+            if semantic == 'NORMAL':
+                result['normals'] = values[:, :3]
+            elif semantic == 'TEXCOORD':
+                result['uvs'].append(values[:, :2])
+            elif semantic == 'COLOR':
+                if values.shape[1] == 3:
+                    values = np.concatenate((values, np.ones((len(values), 1), dtype=np.float32)), axis=1)
+                result['colors'].append(values[:, :4])
+        return result
+
+    def mesh_index(self, geometry, controller=None) -> int:
+        key = (geometry.get('id'), controller.get('id') if controller is not None else None)
+        if key in self.mesh_lookup:
+            return self.mesh_lookup[key]
+        mesh = geometry.find(self.q('mesh'))
+        if mesh is None:
+            raise ValueError(f'geometry {key[0]} is not a mesh')
+        vertices = mesh.find(self.q('vertices'))
+        vertex_inputs = {i.get('semantic'): (i.get('source'), int(i.get('set', 0))) for i in vertices.findall(self.q('input'))}
+        positions = self.source_array(vertex_inputs['POSITION'][0])[:, :3]
+
+        primitives = []
+        for primitive in mesh:
+            tag = local_name(primitive.tag)
+            if tag in ('triangles', 'polylist', 'polygons'):
+                primitives.append(self.read_primitive(primitive, vertex_inputs))
+            elif tag in ('lines', 'linestrips', 'trifans', 'tristrips'):
+                raise ValueError(f'{tag} primitives are not supported')
+
+        symbols = []
+        for primitive in primitives:
+            if primitive['symbol'] not in symbols:
+                symbols.append(primitive['symbol'])
+        uv_sets = max((len(p['uvs']) for p in primitives), default=0)
+        color_sets = max((len(p['colors']) for p in primitives), default=0)
+        # normals are only kept if every primitive has them, blender calculates the rest
+        has_normals = bool(primitives) and all(p['normals'] is not None for p in primitives)
+
+        loops = [p['loops'] for p in primitives]
+        arrays = {
+            'loops': np.concatenate(loops) if loops else np.empty(0, dtype=np.int32),
+            'sizes': np.concatenate([p['sizes'] for p in primitives]) if primitives else np.empty(0, dtype=np.int32),
+            'materials': np.concatenate(
+                [np.full(len(p['sizes']), symbols.index(p['symbol']), dtype=np.int16) for p in primitives])
+            if primitives else np.empty(0, dtype=np.int16),
+        }
+        if has_normals:
+            arrays['normals'] = np.concatenate([p['normals'] for p in primitives])
+        for j in range(uv_sets):
+            arrays[f'uv{j}'] = np.concatenate([
+                p['uvs'][j] if j < len(p['uvs']) else np.zeros((len(p['loops']), 2), dtype=np.float32)
+                for p in primitives])
+        for j in range(color_sets):
+            arrays[f'color{j}'] = np.concatenate([
+                p['colors'][j] if j < len(p['colors']) else np.ones((len(p['loops']), 4), dtype=np.float32)
+                for p in primitives])
+
+        groups = []
+        if controller is not None:
+            skin = controller.find(self.q('skin'))
+            bind_shape = parse_floats(skin.findtext(self.q('bind_shape_matrix')))
+            if len(bind_shape) == 16:
+                bind_shape = bind_shape.reshape(4, 4)
+                positions = positions @ bind_shape[:3, :3].T.astype(np.float32) + bind_shape[:3, 3].astype(np.float32)
+            groups, arrays['weight_vertices'], arrays['weight_groups'], arrays['weights'] = self.read_skin(skin)
+        arrays['positions'] = np.ascontiguousarray(positions, dtype=np.float32)
+        vertex_count = len(positions)
+        clean_mesh(arrays)
+
+        index = len(self.meshes)
+        for name, array in arrays.items():
+            self.arrays[f'mesh{index}_{name}'] = array
+        self.meshes.append({
+            'name': geometry.get('name') or geometry.get('id'),
+            'symbols': symbols,
+            'uv_sets': uv_sets,
+            'color_sets': color_sets,
+            'normals': has_normals,
+            'groups': groups,
+            'welded': vertex_count - len(arrays['positions']),
+        })
+        self.mesh_lookup[key] = index
+        return index
+
+    def read_skin(self, skin) -> tuple:
+        """(vertex group names, vertex index, group index, weight) of every skin weight"""
+        joints = skin.find(self.q('joints'))
+        joint_source = next(i.get('source') for i in joints.findall(self.q('input')) if i.get('semantic') == 'JOINT')
+        # vertex groups are named after the bone, the skin may name a joint by sid, name or id
+        groups = []
+        for name in self.source_names(joint_source):
+            joint = self.joint_lookup.get(name)
+            groups.append(self.joints[joint]['name'] if joint is not None else name)
+
+        vertex_weights = skin.find(self.q('vertex_weights'))
+        inputs = vertex_weights.findall(self.q('input'))
+        stride = max(int(i.get('offset', 0)) for i in inputs) + 1
+        counts = parse_ints(vertex_weights.findtext(self.q('vcount')))
+        pairs = parse_ints(vertex_weights.findtext(self.q('v')))
+        pairs = pairs[:len(pairs) // stride * stride].reshape(-1, stride)
+        vertex_ids = np.repeat(np.arange(len(counts)), counts)[:len(pairs)]
+        group_ids = np.full(len(pairs), -1)
+        weights = np.ones(len(pairs), dtype=np.float32)
+        for skin_input in inputs:
+            column = pairs[:, int(skin_input.get('offset', 0))]
+            if skin_input.get('semantic') == 'JOINT':
+                group_ids = column
+            elif skin_input.get('semantic') == 'WEIGHT':
+                weights = self.source_array(skin_input.get('source'))[column, 0]
+        # -1 is the bind shape itself, not a joint
+        keep = group_ids >= 0
+        return groups, vertex_ids[keep].astype(np.int32), group_ids[keep].astype(np.int32), weights[keep]
+
+    def bound_materials(self, instance, symbols: list) -> list:
+        """material index for each of the mesh's material symbols, -1 if it isn't bound"""
+        bound = {}
+        for instance_material in instance.iter(self.ns + 'instance_material'):
+            bound[instance_material.get('symbol')] = self.material_index(instance_material.get('target'))
+        return [bound.get(symbol, -1) for symbol in symbols]
+
+    def walk_joints(self, node, parent_matrix, parent_joint):
+        matrix = parent_matrix @ self.node_matrix(node)
+        if node.get('type') == 'JOINT':
+            index = len(self.joints)
+            self.joints.append({
+                'name': node.get('name') or node.get('sid') or node.get('id'),
+                'parent': parent_joint,
+                'matrix': matrix.tolist(),
+            })
+            for key in ('id', 'name', 'sid'):
+                if node.get(key):
+                    self.joint_lookup.setdefault(node.get(key), index)
+            parent_joint = index
+        for child in node.findall(self.q('node')):
+            self.walk_joints(child, matrix, parent_joint)
+
+    def walk_objects(self, node, parent_matrix):
+        matrix = parent_matrix @ self.node_matrix(node)
+        name = node.get('name') or node.get('id')
+        for instance in node.findall(self.q('instance_geometry')):
+            geometry = self.by_url(instance.get('url'))
+            if geometry is None:
+                continue
+            mesh = self.mesh_index(geometry)
+            self.objects.append({
+                'name': name,
+                'mesh': mesh,
+                'matrix': matrix.tolist(),
+                'materials': self.bound_materials(instance, self.meshes[mesh]['symbols']),
+                'skinned': False,
+            })
+        for instance in node.findall(self.q('instance_controller')):
+            controller = self.by_url(instance.get('url'))
+            skin = controller.find(self.q('skin')) if controller is not None else None
+            geometry = self.by_url(skin.get('source')) if skin is not None else None
+            if geometry is None:
+                continue
+            mesh = self.mesh_index(geometry, controller)
+            self.objects.append({
+                'name': name,
+                'mesh': mesh,
+                'matrix': matrix.tolist(),
+                'materials': self.bound_materials(instance, self.meshes[mesh]['symbols']),
+                'skinned': True,
+            })
+        for child in node.findall(self.q('node')):
+            self.walk_objects(child, matrix)
+
+    def read(self):
+        instance_scene = self.root.find(self.q('scene/instance_visual_scene'))
+        scene = self.by_url(instance_scene.get('url')) if instance_scene is not None else None
+        if scene is None:
+            scene = self.root.find(self.q('library_visual_scenes/visual_scene'))
+        if scene is None:
+            raise ValueError(f'{self.dae_path} has no visual scene')
+        # every joint first, skins need them to name their vertex groups
+        for node in scene.findall(self.q('node')):
+            self.walk_joints(node, np.identity(4), -1)
+        for node in scene.findall(self.q('node')):
+            self.walk_objects(node, np.identity(4))
+        return self
+
+    def meta(self) -> dict:
+        return {
+            'version': GEOMETRY_VERSION,
+            'source': Path(self.dae_path).name,
+            'up_axis': self.up_axis(),
+            'materials': self.materials,
+            'joints': self.joints,
+            'meshes': self.meshes,
+            'objects': self.objects,
+        }
+
+
+def extract(dae_file_path) -> Path:
+    """reads the dae's geometry into its .npz geometry cache"""
+    document = collada_document(dae_file_path).read()
+    geometry_path = get_geometry_path(dae_file_path)
+    geometry_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temp file first so a half written cache is never loaded
+    temp_path = f'{geometry_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(document.meta())), **document.arrays)
+    os.replace(temp_path, geometry_path)
+    return geometry_path
+
+
+def load_geometry(geometry_path) -> tuple:
+    """(meta, arrays) of a geometry cache, None if it's missing or from another version"""
+    if not Path(geometry_path).is_file():
+        return None
+    with np.load(geometry_path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('version') != GEOMETRY_VERSION:
+            return None
+        arrays = {key: data[key] for key in data.files if key != 'meta'}
+    return meta, arrays
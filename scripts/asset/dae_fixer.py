@@ -1,5 +1,4 @@
 import os
-import shutil
 from pathlib import Path
 import re
 import json
@@ -8,7 +7,7 @@ texture_directory_relative = '..\\..\\textures\\'
 parsed_collada_directory = 'collada_parsed\\'
 
 
-# make a copy of the dae file
+# rewrite the dae file into collada_parsed
 # set the relative texture directory
 # simplify all the texcoord names to make it easier for the native blender importer
 #   the dae files exported from programs like switch toolbox are valid as far as I can tell
@@ -25,70 +24,94 @@ def get_new_dae_path(dae_file_path) -> Path:
     return new_dae_file_path
 
 
-def fix_dae(dae_file_path):
-    # copy file
+def needs_fix(dae_file_path) -> bool:
+    """the fixed dae is missing, or older than its source or this script"""
+    new_dae_file_path = get_new_dae_path(dae_file_path)
+    if not new_dae_file_path.is_file():
+        return True
+    fixed_mtime = new_dae_file_path.stat().st_mtime_ns
+    return fixed_mtime < os.stat(dae_file_path).st_mtime_ns or fixed_mtime < os.stat(__file__).st_mtime_ns
+
+
+def fix_dae(dae_file_path, quiet=False):
     dae_file_path_parent = Path(dae_file_path).parent.stem
     parent_directory = Path(f'{parsed_collada_directory}{dae_file_path_parent}').absolute()
-    if not parent_directory.is_dir():
-        parent_directory.mkdir()
+    parent_directory.mkdir(parents=True, exist_ok=True)
     new_dae_file_path = Path(
         str(parent_directory) + '\\' +
         str(Path(dae_file_path).stem) + '.dae'
     ).absolute()
-    print(new_dae_file_path)
-    if os.path.exists(new_dae_file_path):
-        os.remove(new_dae_file_path)
-    shutil.copyfile(dae_file_path, new_dae_file_path)
-    # fix_texture_dir(new_dae_file_path)
-    open_and_fix_problems(new_dae_file_path)
+    if not quiet:
+        print(new_dae_file_path)
+    rewrite_dae(dae_file_path, new_dae_file_path, quiet)
     return new_dae_file_path
 
 
-def open_and_fix_problems(dae_file_path):
-    lines_to_write = []
+def rewrite_dae(dae_file_path, new_dae_file_path, quiet=False):
+    """streams the source dae straight into collada_parsed with the names simplified, no copy first"""
     with open(dae_file_path, 'r') as file:
-        lines_to_write = file.readlines()
-        lines_to_write = simplify_names(lines_to_write)
-    with open(dae_file_path, 'w') as file:
-        file.writelines(lines_to_write)
+        name_cache = build_name_cache(file)
+    if not quiet:
+        print(json.dumps(name_cache, indent=4))
+    pattern = rename_pattern(name_cache)
 
+    # write next to the destination first so a failed rewrite never leaves half a dae behind
+    temp_path = f'{new_dae_file_path}.{os.getpid()}.tmp'
+    with open(dae_file_path, 'r') as source, open(temp_path, 'w') as file:
+        for line in source:
+            if pattern:
+                line = pattern.sub(lambda match: name_cache[match.group(0)], line)
+            file.write(line)
+    os.replace(temp_path, new_dae_file_path)
 
-# Makes the dae file much less human readable but fixes blender import issues
-def simplify_names(lines: list[str]):
+
+def open_and_fix_problems(dae_file_path):
+    rewrite_dae(dae_file_path, dae_file_path)
+
+
+texcoord_source = re.compile(r'source="#([^"]*-texcoord)')
+color_source = re.compile(r'source="#([^"]*-color)')
+
+
+def build_name_cache(lines) -> dict:
+    """one scan over the lines, original uv map / vertex color source name: simplified name"""
     name_cache = {}
     uv_map_counter = 0
     vertex_col_counter = 0
-    
-    # First pass: Build name cache.
     for line in lines:
+        if 'source="#' not in line:
+            continue
         # TEXCOORD
-        regex_match = re.search('source=".*-texcoord', line)
-        if regex_match:
-            matched_name = regex_match.group()[9:]
-            if matched_name in name_cache:
-                continue
-            matched_name_value = f'UVMap{uv_map_counter}-texcoord'
-            name_cache[matched_name] = matched_name_value
+        regex_match = texcoord_source.search(line)
+        if regex_match and regex_match.group(1) not in name_cache:
+            name_cache[regex_match.group(1)] = f'UVMap{uv_map_counter}-texcoord'
             uv_map_counter += 1
 
         # VCOLOR
-        regex_match = re.search('source=".*-color', line)
-        if regex_match:
-            matched_name = regex_match.group()[9:]
-            if matched_name in name_cache:
-                continue
+        regex_match = color_source.search(line)
+        if regex_match and regex_match.group(1) not in name_cache:
             number_zfill = str(vertex_col_counter).zfill(5)
-            matched_name_value = f'Color{number_zfill}-color'
-            name_cache[matched_name] = matched_name_value
+            name_cache[regex_match.group(1)] = f'Color{number_zfill}-color'
             vertex_col_counter += 1
+    return name_cache
 
-    print(json.dumps(name_cache, indent=4))
 
-    # Second pass: Rename
-    lines_to_write = lines
-    for key, value in name_cache.items():
-        lines_to_write = [re.sub(key, value, x) for x in lines_to_write]
-    return lines_to_write
+def rename_pattern(name_cache: dict):
+    """every name in one compiled alternation, longest first so a name never matches inside a longer one"""
+    if not name_cache:
+        return None
+    names = sorted(name_cache.keys(), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(name) for name in names))
+
+
+# Makes the dae file much less human readable but fixes blender import issues
+def simplify_names(lines: list[str]):
+    name_cache = build_name_cache(lines)
+    print(json.dumps(name_cache, indent=4))
+    pattern = rename_pattern(name_cache)
+    if not pattern:
+        return list(lines)
+    return [pattern.sub(lambda match: name_cache[match.group(0)], x) for x in lines]
 
 
 def fix_texture_dir(lines: list[str]):
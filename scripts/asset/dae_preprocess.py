@@ -0,0 +1,64 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from scripts.asset import dae_fixer
+from scripts.asset import collada_geometry
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+
+def prepare_dae(dae_path: str, fix: bool, extract: bool):
+    """top level so process pool workers can run it, returns the error instead of raising"""
+    try:
+        if fix:
+            dae_fixer.fix_dae(dae_path, quiet=True)
+        if extract:
+            collada_geometry.extract(dae_path)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+    return None
+
+
+def preprocess_daes(dae_paths: list, workers: int = None) -> dict:
+    """
+    fixes every dae whose collada_parsed copy is missing or out of date, and with meshCache on
+    extracts its geometry cache, before any Blender starts.
+    returns dae path: error for the ones that failed, Blender falls back to doing those itself
+    """
+    mesh_cache = bool(config.get("meshCache"))
+    stale = []
+    fixes = []
+    extracts = []
+    for dae_path in dae_paths:
+        fix = dae_fixer.needs_fix(dae_path)
+        extract = mesh_cache and collada_geometry.needs_extract(dae_path)
+        if fix or extract:
+            stale.append(dae_path)
+            fixes.append(fix)
+            extracts.append(extract)
+    print(f'{len(stale)} daes to preprocess')
+    if not stale:
+        return {}
+    tqdm_args = {
+        'total': len(stale),
+        'leave': False,
+        'dynamic_ncols': True,
+        'colour': 'green',
+        'desc': 'Daes Preprocessed'
+    }
+    failed = {}
+    if len(stale) > 8 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            errors = pool.map(prepare_dae, stale, fixes, extracts, chunksize=8)
+            for dae_path, error in tqdm(zip(stale, errors), **tqdm_args):
+                if error:
+                    failed[dae_path] = error
+    else:
+        for dae_path, fix, extract in tqdm(zip(stale, fixes, extracts), **tqdm_args):
+            error = prepare_dae(dae_path, fix, extract)
+            if error:
+                failed[dae_path] = error
+    for dae_path, error in failed.items():
+        print(f'could not preprocess {dae_path}: {error}')
+    return failed
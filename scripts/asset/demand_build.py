@@ -0,0 +1,114 @@
+import os
+import json
+from collections import Counter
+from concurrent.futures import wait, FIRST_COMPLETED
+from tqdm import tqdm
+from scripts.classes.blender_pool import blender_pool
+from scripts.classes.instance_cache import instance_cache_reader
+from scripts.asset.build_scheduler import build_history
+from scripts.asset.build_manifest import build_manifest
+from scripts.asset.dae_preprocess import preprocess_daes
+from scripts.asset.material_rules import material_rules
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+
+def required_models(cache_paths: list) -> Counter:
+    """model name: placement count over the given binary instance caches"""
+    counts = Counter()
+    mubins_seen = set()
+    for cache_path in cache_paths:
+        with instance_cache_reader(cache_path) as reader:
+            for mubin in reader.mubins():
+                # prefix, shard and selected caches can all have the same mubin
+                if mubin in mubins_seen:
+                    continue
+                mubins_seen.add(mubin)
+                for model_name in reader.models(mubin):
+                    counts[model_name] += reader.count(mubin, model_name)
+    return counts
+
+
+def dae_paths_by_model() -> dict:
+    """an asset's blend (and so its model name) is named after its dae"""
+    paths = {}
+    for dirpath, dirnames, files in os.walk(config["colladaPath"]):
+        for name in files:
+            if name.endswith('.dae'):
+                paths.setdefault(name[:-4], os.path.abspath(os.path.join(dirpath, name)))
+    return paths
+
+
+def build_required_assets(model_counts: Counter, quiet=True, timeout=60, import_jobs: list = [],
+                          import_coverage: float = None, import_timeout=600) -> dict:
+    """
+    builds the missing or stale assets the counted models need, most placed first.
+    import_jobs ([func, args] for the helper) start once the built assets cover import_coverage of the placements,
+    the assets only a few placements use keep building alongside the import
+    """
+    if import_coverage is None:
+        import_coverage = config.get("importEarlyCoverage", 0.9)
+    dae_paths = dae_paths_by_model()
+    no_dae = [m for m in model_counts if m not in dae_paths]
+    if no_dae:
+        print(f'{len(no_dae)} models have no dae in {config["colladaPath"]}')
+
+    manifest = build_manifest.load()
+    stale = set(manifest.stale_assets([dae_paths[m] for m in model_counts if m in dae_paths]))
+    manifest.save()
+    to_build = sorted((m for m in model_counts if dae_paths.get(m) in stale), key=lambda m: (-model_counts[m], m))
+
+    # models without a dae will never have an asset, they don't hold the import back
+    total = sum(count for m, count in model_counts.items() if m in dae_paths)
+    waiting = sum(model_counts[m] for m in to_build)
+    print(f'{len(to_build)} of {len(model_counts)} required assets need building')
+    preprocess_daes([dae_paths[m] for m in to_build], config.get("cacheWorkers") or None)
+    material_rules.prepare(manifest.assets)
+
+    history = build_history.load()
+    results = {}
+    tqdm_args = {
+        'total': len(to_build),
+        'leave': False,
+        'dynamic_ncols': True,
+        'colour': 'green',
+        'desc': 'Required Assets Built'
+    }
+    with blender_pool(quiet=quiet) as pool:
+        # only keep as many builds queued as there are workers, so import jobs don't wait behind all of them
+        window = len(pool.workers)
+        pending = {}
+        import_futures = []
+        queue = list(to_build)
+        progress = tqdm(**tqdm_args)
+        while queue or pending:
+            if import_jobs and not import_futures and (total - waiting) >= import_coverage * total:
+                print(f'\n{(total - waiting) / max(total, 1):.0%} of placements have assets, starting the import')
+                import_futures = [pool.submit(func, args, import_timeout) for func, args in import_jobs]
+            while queue and len(pending) < window:
+                model_name = queue.pop(0)
+                dae_path = dae_paths[model_name]
+                future = pool.submit('build_asset', [dae_path, '--rebuild'], history.timeout(dae_path, timeout))
+                pending[future] = model_name
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                model_name = pending.pop(future)
+                res = future.result()
+                history.record(dae_paths[model_name], res)
+                if res['status'] in ('complete', 'already built'):
+                    manifest.record_built(dae_paths[model_name])
+                waiting -= model_counts[model_name]
+                results[model_name] = res
+                progress.update(1)
+        progress.close()
+        if import_jobs and not import_futures:
+            import_futures = [pool.submit(func, args, import_timeout) for func, args in import_jobs]
+        for future in import_futures:
+            print(f'import {future.result()["status"]}')
+    history.save()
+    manifest.save()
+
+    built = sum(1 for res in results.values() if res['status'] in ('complete', 'already built'))
+    print(f'\nBuilt {built} of {len(to_build)} required assets')
+    return results
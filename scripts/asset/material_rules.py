@@ -0,0 +1,189 @@
+import os
+import json
+import pickle
+import hashlib
+from pathlib import Path
+
+snapshot_path = 'linked_resources\\json\\generated\\material_rules.pickle'
+SNAPSHOT_VERSION = 2
+rule_sources = {
+    'normals': 'linked_resources\\json\\generated\\normals.json',
+    'masks': 'linked_resources\\json\\generated\\masks.json',
+    'trs': 'linked_resources\\json\\generated\\trs.json',
+    'terrainmat_names': 'linked_resources\\json\\terrainmat_names.json',
+    'assets_info': 'linked_resources\\json\\assets_info.json',
+    'sensible_defaults': 'linked_resources\\json\\sensible_defaults.json',
+}
+"""everything shader_fixer looks materials up in"""
+# shader_fixer cuts <stem>Alb.png down to the stem before looking for textures
+image_suffix_length = len('Alb.png')
+
+loaded = None
+"""(snapshot mtime, header) so a Blender worker only reads the header again when the snapshot changes"""
+
+
+def source_signature() -> dict:
+    signature = {}
+    for name, path in rule_sources.items():
+        try:
+            stat = os.stat(path)
+            signature[name] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            signature[name] = None
+    return signature
+
+
+def references_digest(references: dict) -> str:
+    """what an asset's entry was filtered by, a dae that now uses other images or materials needs a new entry"""
+    parts = [sorted(references.get('images', [])), sorted(references.get('materials', []))]
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def load_sources() -> dict:
+    data = {}
+    for name, path in rule_sources.items():
+        data[name] = json.loads(Path(path).read_text()) if Path(path).is_file() else {}
+    return data
+
+
+def full_rules(data: dict, dae_name: str) -> dict:
+    """an asset's rules straight from the sources, every lookup table whole"""
+    return {
+        'assets_info': data['assets_info'].get(dae_name),
+        'sensible_defaults': data['sensible_defaults'],
+        'normals': data['normals'],
+        'masks': data['masks'],
+        'trs': data['trs'],
+    }
+
+
+def asset_rules(data: dict, dae_name: str, images: list, materials: list) -> dict:
+    """only the entries an asset's images and materials can hit"""
+    stems = {image[:-image_suffix_length] for image in images}
+    defaults = {}
+    for material in materials:
+        default = data['sensible_defaults'].get(material.lower())
+        if default:
+            defaults[material.lower()] = default
+    return {
+        'assets_info': data['assets_info'].get(dae_name),
+        'sensible_defaults': defaults,
+        'normals': {stem: True for stem in stems if data['normals'].get(stem)},
+        'masks': {stem: True for stem in stems if data['masks'].get(stem)},
+        'trs': {stem: True for stem in stems if data['trs'].get(stem)},
+    }
+
+
+class material_rules:
+    """
+    Compiled snapshot of the material lookup json, so a Blender worker only reads what one asset needs.
+
+    The file is a small pickled header (version, source signature, terrainmat_names, where each
+    asset's entry is and what it was filtered by) followed by the pickled per-asset entries, each read with a single seek.
+    """
+
+    def __init__(self):
+        self.signature: dict = {}
+        self.terrainmat_names: dict = {}
+        self.offsets: dict = {}
+        """dae name: (offset after the header, length)"""
+        self.references: dict = {}
+        """dae name: digest of the images and materials its entry was filtered by"""
+        self.entries_start = 0
+
+    def load_header():
+        if not Path(snapshot_path).is_file():
+            return None
+        try:
+            with open(snapshot_path, 'rb') as f:
+                header = pickle.load(f)
+                if header.get('version') != SNAPSHOT_VERSION:
+                    return None
+                rules = material_rules()
+                rules.signature = header['signature']
+                rules.terrainmat_names = header['terrainmat_names']
+                rules.offsets = header['offsets']
+                rules.references = header['references']
+                rules.entries_start = f.tell()
+                return rules
+        except Exception:
+            print('material rules snapshot unreadable')
+            return None
+
+    def is_current(self, assets: dict = None) -> bool:
+        """assets like compile takes, every one of them has to be in the snapshot with the same references"""
+        if self.signature != source_signature():
+            return False
+        for dae_name, references in (assets or {}).items():
+            if dae_name not in self.offsets or self.references.get(dae_name) != references_digest(references):
+                return False
+        return True
+
+    def entry(self, dae_name: str):
+        position = self.offsets.get(dae_name)
+        if position is None:
+            return None
+        offset, length = position
+        with open(snapshot_path, 'rb') as f:
+            f.seek(self.entries_start + offset)
+            return pickle.loads(f.read(length))
+
+    def compile(assets: dict):
+        """
+        writes the snapshot for assets (dae name: {'images': [...], 'materials': [...]}, like the build manifest has)
+        """
+        signature = source_signature()
+        data = load_sources()
+        offsets = {}
+        digests = {}
+        blobs = []
+        position = 0
+        for dae_name, references in sorted(assets.items()):
+            blob = pickle.dumps(
+                asset_rules(data, dae_name, references.get('images', []), references.get('materials', [])),
+                protocol=pickle.HIGHEST_PROTOCOL)
+            offsets[dae_name] = (position, len(blob))
+            digests[dae_name] = references_digest(references)
+            blobs.append(blob)
+            position += len(blob)
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'signature': signature,
+            'terrainmat_names': data['terrainmat_names'],
+            'offsets': offsets,
+            'references': digests,
+        }
+        # write to a temp file first so a worker never reads half a snapshot
+        temp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temp_path, snapshot_path)
+        print(f'compiled material rules for {len(offsets)} assets')
+
+    def prepare(assets: dict):
+        """recompiles the snapshot if a source changed, or an asset isn't in it or references other images or materials"""
+        rules = material_rules.load_header()
+        if rules and rules.is_current(assets):
+            return
+        material_rules.compile(assets)
+
+
+def rules_for(dae_name: str) -> tuple:
+    """(terrainmat_names, the asset's rules), from the snapshot if it's current, else from the json"""
+    global loaded
+    try:
+        snapshot_mtime = os.stat(snapshot_path).st_mtime_ns
+    except OSError:
+        snapshot_mtime = None
+    if not loaded or loaded[0] != snapshot_mtime:
+        loaded = (snapshot_mtime, material_rules.load_header())
+    rules = loaded[1]
+    if rules and rules.is_current():
+        entry = rules.entry(dae_name)
+        if entry is not None:
+            return rules.terrainmat_names, entry
+    print(f'{dae_name} not in the material rules snapshot, reading the json')
+    data = load_sources()
+    return data['terrainmat_names'], full_rules(data, dae_name)
@@ -0,0 +1,216 @@
+import bpy
+import os
+import json
+import math
+import traceback
+import numpy as np
+from mathutils import Matrix
+from scripts.asset import collada_geometry
+from scripts.asset import dae_fixer
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+textures_path_abs = os.path.abspath(config['texturesPath'])
+BONE_LENGTH = .1
+# blender's collada importer turns the root objects so the file's up axis is Z
+up_axis_rotation = {
+    'Z_UP': Matrix.Identity(4),
+    'Y_UP': Matrix.Rotation(math.radians(90), 4, 'X'),
+    'X_UP': Matrix.Rotation(math.radians(-90), 4, 'Y'),
+}
+
+
+def load_image(image_file: str, dae_path: str):
+    name = os.path.basename(image_file.replace('\\', '/'))
+    image = bpy.data.images.get(name)
+    if image:
+        return image
+    # the same places the collada importer looks, then the textures folder shader_fixer uses
+    candidates = [
+        image_file,
+        os.path.join(os.path.dirname(str(dae_fixer.get_new_dae_path(dae_path))), image_file),
+        os.path.join(textures_path_abs, name),
+    ]
+    for path in candidates:
+        if os.path.isfile(path):
+            return bpy.data.images.load(os.path.abspath(path), check_existing=True)
+    # keep a placeholder like the importer does so shader_fixer still finds the image name
+    print(f'image not found: {image_file}')
+    image = bpy.data.images.new(name, 1, 1)
+    image.source = 'FILE'
+    image.filepath = candidates[-1]
+    return image
+
+
+def build_materials(meta: dict, dae_path: str) -> list:
+    materials = []
+    for info in meta['materials']:
+        material = bpy.data.materials.new(info['name'])
+        material.use_nodes = True
+        material_nodes = material.node_tree.nodes
+        material_links = material.node_tree.links
+        principled = material_nodes.get('Principled BSDF')
+        for i, (label, image_file) in enumerate(info['images'].items()):
+            image_node = material_nodes.new(type='ShaderNodeTexImage')
+            image_node.label = label
+            image_node.image = load_image(image_file, dae_path)
+            image_node.location = (-300, 300 - 300 * i)
+            if principled and label == 'Base Color':
+                material_links.new(principled.inputs['Base Color'], image_node.outputs['Color'])
+        materials.append(material)
+    return materials
+
+
+def build_armature(meta: dict, collection, up: Matrix):
+    armature_data = bpy.data.armatures.new('Armature')
+    armature = bpy.data.objects.new('Armature', armature_data)
+    collection.objects.link(armature)
+    armature.matrix_world = up
+    bpy.context.view_layer.objects.active = armature
+    bpy.ops.object.mode_set(mode='EDIT')
+    bones = []
+    for joint in meta['joints']:
+        bone = armature_data.edit_bones.new(joint['name'])
+        bone.head = (0, 0, 0)
+        bone.tail = (0, BONE_LENGTH, 0)
+        # edit bones have no scale, only keep location and rotation
+        location, rotation, scale = Matrix(joint['matrix']).decompose()
+        bone.matrix = Matrix.Translation(location) @ rotation.to_matrix().to_4x4()
+        if joint['parent'] >= 0:
+            bone.parent = bones[joint['parent']]
+        bones.append(bone)
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return armature
+
+
+def build_mesh(meta: dict, arrays: dict, index: int):
+    info = meta['meshes'][index]
+    prefix = f'mesh{index}'
+    positions = arrays[f'{prefix}_positions']
+    loops = arrays[f'{prefix}_loops']
+    sizes = arrays[f'{prefix}_sizes']
+
+    mesh = bpy.data.meshes.new(info['name'])
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set('co', positions.ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.add(len(sizes))
+    loop_starts = np.zeros(len(sizes), dtype=np.int32)
+    np.cumsum(sizes[:-1], out=loop_starts[1:])
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    # loop_total is worked out from loop_start in newer versions
+    if not mesh.polygons.bl_rna.properties['loop_total'].is_readonly:
+        mesh.polygons.foreach_set('loop_total', sizes)
+    mesh.polygons.foreach_set('material_index', arrays[f'{prefix}_materials'].astype(np.int32))
+
+    for j in range(info['uv_sets']):
+        uv_layer = mesh.uv_layers.new(name=f'UVMap{j}')
+        uv_layer.data.foreach_set('uv', arrays[f'{prefix}_uv{j}'].ravel())
+    for j in range(info['color_sets']):
+        number_zfill = str(j).zfill(5)
+        color_attribute = mesh.color_attributes.new(f'Color{number_zfill}', 'FLOAT_COLOR', 'CORNER')
+        color_attribute.data.foreach_set('color', arrays[f'{prefix}_color{j}'].ravel())
+
+    mesh.update(calc_edges=True)
+    mesh.validate(clean_customdata=False)
+    normals = arrays.get(f'{prefix}_normals')
+    # validate may have dropped broken faces, the loop normals only line up if it didn't
+    if normals is not None and len(normals) == len(mesh.loops):
+        mesh.polygons.foreach_set('use_smooth', np.ones(len(mesh.polygons), dtype=bool))
+        if hasattr(mesh, 'use_auto_smooth'):
+            mesh.use_auto_smooth = True
+        mesh.normals_split_custom_set(normals)
+    return mesh
+
+
+def add_weights(obj, meta: dict, arrays: dict, index: int):
+    prefix = f'mesh{index}'
+    groups = [obj.vertex_groups.new(name=name) for name in meta['meshes'][index]['groups']]
+    vertex_ids = arrays[f'{prefix}_weight_vertices']
+    group_ids = arrays[f'{prefix}_weight_groups']
+    weights = arrays[f'{prefix}_weights']
+    if not len(weights):
+        return
+    # one add per group and weight instead of one per vertex, most weights are 1
+    order = np.lexsort((weights, group_ids))
+    vertex_ids, group_ids, weights = vertex_ids[order], group_ids[order], weights[order]
+    splits = np.flatnonzero((group_ids[1:] != group_ids[:-1]) | (weights[1:] != weights[:-1])) + 1
+    for start, end in zip(np.concatenate(([0], splits)), np.concatenate((splits, [len(weights)]))):
+        groups[group_ids[start]].add(vertex_ids[start:end].tolist(), float(weights[start]), 'REPLACE')
+
+
+def build_objects(meta: dict, arrays: dict, dae_path: str, collection, created: list):
+    up = up_axis_rotation.get(meta['up_axis'], up_axis_rotation['Y_UP'])
+    materials = build_materials(meta, dae_path)
+    created += materials
+    armature = build_armature(meta, collection, up)
+    created += [armature.data, armature]
+
+    meshes = {}
+    for info in meta['objects']:
+        # objects never share mesh data, shader_fixer changes materials per object
+        if info['mesh'] in meshes:
+            mesh = meshes[info['mesh']].copy()
+        else:
+            mesh = meshes[info['mesh']] = build_mesh(meta, arrays, info['mesh'])
+        created.append(mesh)
+        obj = bpy.data.objects.new(info['name'], mesh)
+        collection.objects.link(obj)
+        created.append(obj)
+        mesh.materials.clear()
+        for material_index in info['materials']:
+            mesh.materials.append(materials[material_index] if material_index >= 0 else None)
+        matrix = Matrix(info['matrix'])
+        if info['skinned']:
+            obj.parent = armature
+            obj.matrix_basis = matrix
+            add_weights(obj, meta, arrays, info['mesh'])
+            modifier = obj.modifiers.new('Armature', 'ARMATURE')
+            modifier.object = armature
+        else:
+            obj.matrix_world = up @ matrix
+
+
+def build_from_cache(dae_path: str) -> bool:
+    """
+    builds the asset's armature and meshes from its .npz geometry cache with foreach_set,
+    False if the asset has to go through the collada importer instead
+    """
+    if collada_geometry.needs_extract(dae_path):
+        try:
+            collada_geometry.extract(dae_path)
+        except Exception as e:
+            print(f'geometry cache failed for {dae_path}: {e}')
+            return False
+    loaded = collada_geometry.load_geometry(collada_geometry.get_geometry_path(dae_path))
+    if not loaded:
+        return False
+    meta, arrays = loaded
+    if not meta['joints']:
+        # build_asset expects the importer's Armature
+        print('geometry cache has no skeleton, using the collada importer')
+        return False
+
+    print('building from geometry cache')
+    created = []
+    try:
+        build_objects(meta, arrays, dae_path, bpy.context.collection, created)
+    except Exception:
+        traceback.print_exc()
+        if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        # nothing half built is left for the importer to trip over
+        for block in reversed(created):
+            if isinstance(block, bpy.types.Object):
+                bpy.data.objects.remove(block)
+            elif isinstance(block, bpy.types.Mesh):
+                bpy.data.meshes.remove(block)
+            elif isinstance(block, bpy.types.Armature):
+                bpy.data.armatures.remove(block)
+            elif isinstance(block, bpy.types.Material):
+                bpy.data.materials.remove(block)
+        return False
+    bpy.ops.object.select_all(action='DESELECT')
+    return True
@@ -5,6 +5,7 @@ from mathutils import Vector
 import os
 import json
 from pathlib import Path
+from scripts.asset import material_rules
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
@@ -15,24 +16,12 @@ textures_path_abs = os.path.abspath(textures_path)
 asset_name = "test"
 
 
-with open(f"linked_resources\\json\\generated\\normals.json", "r") as f:
-    normals: dict = json.load(f)
-    f.close()
-with open(f"linked_resources\\json\\generated\\masks.json", "r") as f:
-    masks: dict = json.load(f)
-    f.close()
-with open(f"linked_resources\\json\\generated\\trs.json", "r") as f:
-    trs: dict = json.load(f)
-    f.close()
-with open(f"linked_resources\\json\\terrainmat_names.json", "r") as f:
-    terrainmat_names: dict = json.load(f)
-    f.close()
-with open(f"linked_resources\\json\\assets_info.json", "r") as f:
-    assets_info: dict = json.load(f)
-    f.close()
-with open(f"linked_resources\\json\\sensible_defaults.json", "r") as f:
-    sensible_defaults: dict = json.load(f)
-    f.close()
+# filled per asset by fix_shaders from the compiled material rules, see scripts\\asset\\material_rules.py
+normals: dict = {}
+masks: dict = {}
+trs: dict = {}
+terrainmat_names: dict = {}
+sensible_defaults: dict = {}
 
 
 # common patterns for shaderOptionsIndexArray (made from uking_texture_array_texture)
@@ -236,21 +225,30 @@ def terrain_and_image_shader(object: bpy.types.Object):
     material_links.new(shader.inputs["Base Color"], actor_terrain_image_node.outputs["Color"])
 
 
-def alpha_blend_edges(object, material_nodes, material_links, shader):
-    # if we're 'translucent' alpha blend the edges
-    if object.active_material.blend_method != "BLEND":
-        return False
-
+def alpha_blend_excluded(object):
     # exclude some names this shouldn't apply to
     name_exclude = ['paint', 'house', 'sign']
     obj_name_lower = object.name.lower()
     for name in name_exclude:
         if name in obj_name_lower:
-            return False
+            return True
+    return False
+
+
+def alpha_blend_edges(object, material_nodes, material_links, shader):
+    # if we're 'translucent' alpha blend the edges
+    if object.active_material.blend_method != "BLEND":
+        return False
+    if alpha_blend_excluded(object):
+        return False
 
     geometry_nodes_edge(object)
     if not solidify_modifier(object):
         return False
+    alpha_blend_nodes(material_nodes, material_links, shader)
+
+
+def alpha_blend_nodes(material_nodes, material_links, shader):
     # color attribute -> invert -> bright/contrast -> clamp
     color_attribute_node = material_nodes.new(type='ShaderNodeVertexColor')
     color_attribute_node.layer_name = 'edge'
@@ -359,6 +357,21 @@ def make_light(name: str, power, size, color):
     return light_object
 
 
+def render_state_blend(mat_info, blend_method="HASHED"):
+    render_state = mat_info.get("renderState") if mat_info else None
+    if render_state:
+        if render_state == "Opaque":
+            return "OPAQUE"
+        elif render_state == "AlphaMask":
+            return "HASHED"
+        elif render_state == "Custom":
+            return "HASHED"
+        elif render_state == "Translucent":
+            return "BLEND"
+        return blend_method
+    return "HASHED"
+
+
 def apply_mat_info(object, mat_info):
     print(mat_info)
     o = object
@@ -367,18 +380,7 @@ def apply_mat_info(object, mat_info):
     shader = get_node_by_label('SharedBSDF', material_nodes)
     base_color = get_node_by_label('Base Color', material_nodes)
 
-    render_state = mat_info.get("renderState")
-    if render_state:
-        if mat_info.get("renderState") == "Opaque":
-            o.active_material.blend_method = "OPAQUE"
-        elif mat_info.get("renderState") == "AlphaMask":
-            o.active_material.blend_method = "HASHED"
-        elif mat_info.get("renderState") == "Custom":
-            o.active_material.blend_method = "HASHED"
-        elif mat_info.get("renderState") == "Translucent":
-            o.active_material.blend_method = "BLEND"
-    else:
-        o.active_material.blend_method = "HASHED"
+    o.active_material.blend_method = render_state_blend(mat_info, o.active_material.blend_method)
     indices: list = mat_info.get('indexArray')
     soindices: list = mat_info.get('shaderOptionsIndexArray')
     existing_image = False
@@ -391,13 +393,28 @@ def apply_mat_info(object, mat_info):
     return False
 
 
+node_indexes = {}
+"""node tree pointer: {label: first node with it}, so a lookup doesn't walk every node"""
+
+
 def get_node_by_label(label, material_nodes):
+    key = material_nodes.id_data.as_pointer()
+    index = node_indexes.get(key)
+    if index is not None:
+        nd = index.get(label)
+        try:
+            if nd is not None and nd.label == label:
+                return nd
+        except ReferenceError:
+            # removed since the index was built
+            pass
+    # a miss might just be a node added since, index the tree again
+    index = {}
     for nd in material_nodes:
-        print(nd.label)
-        if nd.label == label:
-            return nd
-    print(f'node {label} not found')
-    return None
+        if nd.label and nd.label not in index:
+            index[nd.label] = nd
+    node_indexes[key] = index
+    return index.get(label)
 
 
 def flip_negative_x_uv(object):
@@ -440,9 +457,283 @@ def flip_negative_x_uv(object):
     bm.free()
 
 
+def shared_shader(o):
+    # use shared shader instead
+    material_nodes = o.active_material.node_tree.nodes
+    material_links = o.active_material.node_tree.links
+    existing_shader = material_nodes.get('Principled BSDF')
+    if existing_shader:
+        material_nodes.remove(existing_shader)
+    shader_tree = append_node_tree('SharedBSDF')
+    shader = material_nodes.new(type='ShaderNodeGroup')
+    shader.node_tree = shader_tree
+    shader.name = 'SharedBSDF'
+    shader.label = 'SharedBSDF'
+    shader.location[1] += 300
+    material_output = material_nodes.get('Material Output')
+    material_links.new(material_output.inputs["Surface"], shader.outputs["BSDF Eevee"])
+    material_output_cycles = material_nodes.new(type='ShaderNodeOutputMaterial')
+    material_output_cycles.target = 'CYCLES'
+    material_output_cycles.location[0] = material_output.location[0]
+    material_output_cycles.location[1] = material_output.location[1] - 150
+    material_links.new(material_output_cycles.inputs["Surface"], shader.outputs["BSDF Cycles"])
+
+    specular_node = get_node_by_label('Specular', material_nodes)
+    if specular_node:
+        material_links.new(shader.inputs["Specular"], specular_node.outputs["Color"])
+
+    emission_image_node = get_node_by_label('Emission', material_nodes)
+    if emission_image_node:
+        material_links.new(shader.inputs["Emission"], emission_image_node.outputs["Color"])
+
+    if 'metal' in o.name.lower():
+        shader.inputs['Metallic'].default_value = 1
+    return shader, material_output, material_output_cycles
+
+
+def find_texture(image_name, listed):
+    # might already be imported
+    image = bpy.data.images.get(image_name)
+    if not image and listed:
+        image = bpy.data.images.load(f"{textures_path_abs}\\{image_name}")
+    return image
+
+
+def lamp_kind(o, dae_name):
+    possible_lamp_name_artefacts = ['lamp', 'light']
+    is_lamp = False
+    for ln in possible_lamp_name_artefacts:
+        is_lamp = is_lamp or ln in dae_name.lower() or ln in o.name.lower()
+    if not is_lamp:
+        return None
+    if 'glass' in o.name.lower():
+        return 'glass'
+    wide2_lamp_names = [
+        'gerudo_light_a_01',
+        'gerudo_light_a_02',
+        'gerudo_light_a_03',
+    ]
+    for ln in wide2_lamp_names:
+        if ln in o.name.lower() or ln in dae_name.lower():
+            return 'wide2'
+    return 'wide1'
+
+
+def image_recipe(o, dae_name, blend_method):
+    """
+    (recipe, images) for a material with a base color image. The recipe is everything that decides
+    its node tree, the images are all that differ between materials with the same recipe
+    """
+    material_nodes = o.active_material.node_tree.nodes
+    base_color = get_node_by_label('Base Color', material_nodes)
+    specular_node = get_node_by_label('Specular', material_nodes)
+    emission_image_node = get_node_by_label('Emission', material_nodes)
+    name_lower = o.name.lower()
+
+    image_stem = base_color.image.name[:-7]
+    print(f'image stem: {image_stem}')
+    mask_image = find_texture(image_stem+"Msk.png", masks.get(image_stem))
+    # glass and lamps only matter when there's no mask
+    lamp = lamp_kind(o, dae_name) if not mask_image else None
+    glass = not mask_image and 'glass' in name_lower
+    # glass lamps get a warm emission instead of a normal map
+    normal_image = None
+    if lamp != 'glass':
+        normal_image = find_texture(image_stem+"Nrm.png", normals.get(image_stem))
+    trs_image = find_texture(image_stem+"Trs.png", trs.get(image_stem))
+
+    recipe = {
+        'blend_method': blend_method,
+        'metal': 'metal' in name_lower,
+        'specular': specular_node is not None,
+        'emission': emission_image_node is not None,
+        'mask': mask_image is not None,
+        'normal': normal_image is not None,
+        'trs': trs_image is not None,
+        'glass': glass,
+        'lamp': lamp,
+        'flowing': 'waterfall' in name_lower or 'lavafall' in name_lower,
+        # the edge nodes only go in when the object didn't have a solidify modifier yet
+        'edges': blend_method == "BLEND" and not alpha_blend_excluded(o) and not o.modifiers.get('Solidify'),
+    }
+    images = {
+        'Base Color': base_color.image,
+        'Specular': specular_node.image if specular_node else None,
+        'Emission': emission_image_node.image if emission_image_node else None,
+        'Mask': mask_image,
+        'Normal': normal_image,
+        'Trs': trs_image,
+    }
+    return recipe, images
+
+
+def new_image_node(material_nodes, label, image):
+    # labeled so a material cloned from this one can swap the image
+    image_node = material_nodes.new(type='ShaderNodeTexImage')
+    image_node.image = image
+    image_node.label = label
+    return image_node
+
+
+def image_shader(o, recipe, images, shader, material_output, material_output_cycles):
+    """the node tree for a material with a base color image, built once per recipe"""
+    material_nodes = o.active_material.node_tree.nodes
+    material_links = o.active_material.node_tree.links
+    base_color = get_node_by_label('Base Color', material_nodes)
+    emission_image_node = get_node_by_label('Emission', material_nodes)
+    specular_node = get_node_by_label('Specular', material_nodes)
+
+    material_links.new(shader.inputs["Base Color"], base_color.outputs["Color"])
+    # handle ALPHA
+    # first check if there's an available mask, if not just wire the base color
+    if recipe['mask']:
+        print('mask found')
+        mask_image_node = new_image_node(material_nodes, 'Mask', images['Mask'])
+        mask_image_node.location[0] -= 600
+        mask_image_node.location[1] -= 300
+        material_links.new(shader.inputs["Alpha"], mask_image_node.outputs["Color"])
+    else:
+        if recipe['glass'] and not recipe['lamp']:
+            # cycles
+            glass_node_tree = append_node_tree('BotW_Cycles_Glass')
+            glass_node = material_nodes.new(type='ShaderNodeGroup')
+            glass_node.node_tree = glass_node_tree
+            glass_node.location[0] += 300
+
+            # eevee
+            default_alpha = .2
+            # if 'inside' in o.name.lower() or 'outside' in o.name.lower():
+            #     default_alpha = .25
+            shader.inputs['Alpha'].default_value = default_alpha
+            shader.inputs['Transmission'].default_value = 1
+        else:
+            material_links.new(shader.inputs["Alpha"], base_color.outputs["Alpha"])
+        # make lamps emissive warmer, the lights are linked per object
+        if recipe['lamp'] == 'glass':
+            print('LAMP DETECTED')
+            if emission_image_node:
+                ramp_tree = append_node_tree('warm_emissive_ramp')
+                ramp = material_nodes.new(type='ShaderNodeGroup')
+                ramp.node_tree = ramp_tree
+                ramp.location[0] -= 250
+                emission_image_node.location[0] -= 200
+                material_links.new(ramp.inputs["Fac"], emission_image_node.outputs["Color"])
+                material_links.new(shader.inputs["Emission"], ramp.outputs["Color"])
+
+                add_emissive_tree = append_node_tree('AddEmissive')
+                add_emissive_node = material_nodes.new(type='ShaderNodeGroup')
+                add_emissive_node.node_tree = add_emissive_tree
+                add_emissive_node.location[0] += 200
+                add_emissive_node.location[1] -= 300
+                material_output.location[0] += 150
+                material_output_cycles.location[0] += 150
+                material_links.new(add_emissive_node.inputs["Shader Eevee"], shader.outputs["BSDF Eevee"])
+                material_links.new(add_emissive_node.inputs["Shader Cycles"], shader.outputs["BSDF Cycles"])
+                material_links.new(add_emissive_node.inputs["Color"], ramp.outputs["Color"])
+                material_links.new(material_output.inputs["Surface"], add_emissive_node.outputs["Shader Eevee"])
+                material_links.new(
+                    material_output_cycles.inputs["Surface"],
+                    add_emissive_node.outputs["Shader Cycles"])
+
+    # handle NORMAL
+    normal_image_node = None
+    if recipe['normal']:
+        normal_image_node = new_image_node(material_nodes, 'Normal', images['Normal'])
+        normal_image_node.location[0] -= 600
+        normal_image_node.location[1] -= 300
+        material_links.new(shader.inputs["Normal Color"], normal_image_node.outputs["Color"])
+    else:
+        print('no normals found')
+
+    # handle trs - roughness and specular
+    if recipe['trs']:
+        trs_image_node = new_image_node(material_nodes, 'Trs', images['Trs'])
+        trs_image_node.location[0] -= 600
+        # easy one is roughness
+        material_links.new(shader.inputs["Roughness"], trs_image_node.outputs["Color"])
+        if not specular_node:
+            material_links.new(shader.inputs["Specular"], trs_image_node.outputs["Color"])
+    else:
+        print('no trs found')
+
+    if recipe['flowing']:
+        # connect a time node to make the uv move
+        botw_time_tree = append_node_tree('BotW_time')
+        botw_time = material_nodes.new(type='ShaderNodeGroup')
+        botw_time.node_tree = botw_time_tree
+        botw_time.location[0] -= 1050
+        texcoord_node = material_nodes.new(type='ShaderNodeTexCoord')
+        texcoord_node.location[0] -= 850
+        texcoord_node.location[1] += 200
+        combine_node = material_nodes.new(type='ShaderNodeCombineXYZ')
+        combine_node.location[0] -= 850
+        combine_node.location[1] -= 200
+        mapping_node = material_nodes.new(type='ShaderNodeMapping')
+        mapping_node.location[0] -= 650
+        material_links.new(combine_node.inputs["Y"], botw_time.outputs["Value"])
+        material_links.new(mapping_node.inputs["Vector"], texcoord_node.outputs["UV"])
+        material_links.new(mapping_node.inputs["Location"], combine_node.outputs["Vector"])
+        material_links.new(base_color.inputs["Vector"], mapping_node.outputs["Vector"])
+        if normal_image_node:
+            material_links.new(normal_image_node.inputs["Vector"], mapping_node.outputs["Vector"])
+
+    if recipe['edges']:
+        alpha_blend_nodes(material_nodes, material_links, shader)
+
+
+def clone_template(template, images):
+    """a copy of the recipe's first material with only the images swapped"""
+    material = template.copy()
+    material_nodes = material.node_tree.nodes
+    for label, image in images.items():
+        image_node = get_node_by_label(label, material_nodes)
+        if image_node:
+            image_node.image = image
+    return material
+
+
+def image_shader_object(o, recipe):
+    # the parts of an image material that belong to the object, done for every object
+    if recipe['lamp'] == 'glass':
+        # find center location
+        # https://blender.stackexchange.com/questions/62040/get-center-of-geometry-of-an-object
+        # local_bbox_center = 0.125 * sum((Vector(b) for b in o.bound_box), Vector())
+        # global_bbox_center = o.matrix_world @ local_bbox_center
+        lamp_obj = link_lamp('lamp_light')
+    elif recipe['lamp'] == 'wide2':
+        # lamp wide 2
+        lamp_obj = link_lamp('lamp_light_wide2')
+    elif recipe['lamp']:
+        # default
+        lamp_obj = link_lamp('lamp_light_wide1')
+    if recipe['blend_method'] == "BLEND" and not alpha_blend_excluded(o):
+        geometry_nodes_edge(o)
+        solidify_modifier(o)
+
+
+def finish_object(o, material_name):
+    # material_name is the imported material's, a fixed copy only gets that name once fix_shaders is done
+    # extra names to solidify
+    solidify_names = ['house_t']
+    obj_name_lower = o.name.lower()
+    for name in solidify_names:
+        if name in obj_name_lower:
+            solidify_modifier(o)
+
+    if 'cloth' in o.name.lower() or 'cloth' in material_name.lower():
+        flip_negative_x_uv(o)
+
+
 def fix_shaders(dae_name):
-    global asset_name
+    global asset_name, normals, masks, trs, terrainmat_names, sensible_defaults
     asset_name = dae_name
+    # only this asset's entries, not the whole of assets_info / sensible_defaults
+    terrainmat_names, rules = material_rules.rules_for(dae_name)
+    normals = rules['normals']
+    masks = rules['masks']
+    trs = rules['trs']
+    sensible_defaults = rules['sensible_defaults']
+    node_indexes.clear()
     # This function does its best to fix all the stuff that the collada import missed
 
     # Vertex color is used as an attribute to mix in a secondary texture
@@ -454,7 +745,14 @@ def fix_shaders(dae_name):
     if not batch_collection:
         print('Default collection not found, shaders cannot be fixed')
         return
-    asset_info = assets_info.get(dae_name)
+    asset_info = rules['assets_info']
+
+    templates = {}
+    """recipe: the first material built with it, later ones are cloned from it"""
+    fixed_materials = {}
+    """(imported material, recipe): the fixed material, objects sharing both share the result"""
+    first_fixed = {}
+    """imported material: its first fixed material, which takes its name once it's unused"""
     for o in batch_collection.objects:
         if o.type != 'MESH':
             continue
@@ -468,8 +766,9 @@ def fix_shaders(dae_name):
             o.hide_viewport = True
             continue
 
-        material_nodes = o.active_material.node_tree.nodes
-        material_links = o.active_material.node_tree.links
+        material = o.active_material
+        material_nodes = material.node_tree.nodes
+        material_links = material.node_tree.links
 
         base_color = get_node_by_label('Base Color', material_nodes)
         if not base_color:
@@ -477,232 +776,77 @@ def fix_shaders(dae_name):
 
         # if 'flag' not in o.name.lower():
         #     o.active_material.use_backface_culling = True
-        o.active_material.blend_method = "HASHED"
 
         # cel shading custom prop
         o["cel"] = 1
 
-        # use shared shader instead
-        existing_shader = material_nodes.get('Principled BSDF')
-        if existing_shader:
-            material_nodes.remove(existing_shader)
-        shader_tree = append_node_tree('SharedBSDF')
-        shader = material_nodes.new(type='ShaderNodeGroup')
-        shader.node_tree = shader_tree
-        shader.name = 'SharedBSDF'
-        shader.label = 'SharedBSDF'
-        shader.location[1] += 300
-        material_output = material_nodes.get('Material Output')
-        material_links.new(material_output.inputs["Surface"], shader.outputs["BSDF Eevee"])
-        material_output_cycles = material_nodes.new(type='ShaderNodeOutputMaterial')
-        material_output_cycles.target = 'CYCLES'
-        material_output_cycles.location[0] = material_output.location[0]
-        material_output_cycles.location[1] = material_output.location[1] - 150
-        material_links.new(material_output_cycles.inputs["Surface"], shader.outputs["BSDF Cycles"])
-
-        specular_node = get_node_by_label('Specular', material_nodes)
-        if specular_node:
-            material_links.new(shader.inputs["Specular"], specular_node.outputs["Color"])
-
-        emission_image_node = get_node_by_label('Emission', material_nodes)
-        if emission_image_node:
-            material_links.new(shader.inputs["Emission"], emission_image_node.outputs["Color"])
-
-        if 'metal' in o.name.lower():
-            shader.inputs['Metallic'].default_value = 1
-
         mat_info = None
         if asset_info:
-            mat_info = asset_info.get(o.active_material.name)
+            mat_info = asset_info.get(material.name)
+
+        material_name_lower = material.name.lower()
+        obj_name_lower = o.name.lower()
+        terrain = mat_info and mat_info.get('indexArray') and mat_info.get('shaderOptionsIndexArray')
+        water = ('water' in material_name_lower or 'water' in obj_name_lower) and 'fall' not in obj_name_lower
+        lava = ('lava' in material_name_lower or 'lava' in obj_name_lower) and 'fall' not in obj_name_lower
+        grudge = 'grudge' in material_name_lower or 'grudge' in obj_name_lower
+
+        if base_color and not (terrain or water or lava or grudge):
+            # image materials are built once per recipe, the rest are cloned with their images swapped
+            blend_method = render_state_blend(mat_info)
+            recipe, images = image_recipe(o, dae_name, blend_method)
+            key = tuple(recipe.items())
+            if (material, key) in fixed_materials:
+                o.active_material = fixed_materials[(material, key)]
+            elif key in templates:
+                o.active_material = clone_template(templates[key], images)
+            else:
+                # built on a copy, the imported material may still be needed for another recipe
+                o.active_material = material.copy()
+                o.active_material.blend_method = blend_method
+                shader, material_output, material_output_cycles = shared_shader(o)
+                image_shader(o, recipe, images, shader, material_output, material_output_cycles)
+                templates[key] = o.active_material
+            fixed_materials[(material, key)] = o.active_material
+            first_fixed.setdefault(material, o.active_material)
+            image_shader_object(o, recipe)
+            finish_object(o, material.name)
+            continue
+
+        o.active_material.blend_method = "HASHED"
+        shader, material_output, material_output_cycles = shared_shader(o)
 
         if mat_info:
             if apply_mat_info(o, mat_info):
                 continue
 
         # handle water
-        if ('water' in o.active_material.name.lower() or 'water' in o.name.lower()) and 'fall' not in o.name.lower():
+        if water:
             water_mat_name = 'BotW_DungeonWater'
             o.active_material = append_material(water_mat_name)
             continue
 
         # handle lava
-        if ('lava' in o.active_material.name.lower() or 'lava' in o.name.lower()) and 'fall' not in o.name.lower():
+        if lava:
             lava_mat_name = 'BotW_Lava'
             o.active_material = append_material(lava_mat_name)
             continue
 
         # handle grudge
-        if ('grudge' in o.active_material.name.lower() or 'grudge' in o.name.lower()):
+        if grudge:
             grudge_mat_name = 'BotW_Grudge'
             o.active_material = append_material(grudge_mat_name)
             continue
 
-        if base_color:
-            material_links.new(shader.inputs["Base Color"], base_color.outputs["Color"])
-            # handle ALPHA
-            # first check if there's an available mask, if not just wire the base color
-            image_stem = base_color.image.name[:-7]
-            print(f'image stem: {image_stem}')
-            add_normal = True
-
-            mask_image_name = image_stem+"Msk.png"
-            mask_image = bpy.data.images.get(mask_image_name)
-            if not mask_image and masks.get(image_stem):
-                mask_image = bpy.data.images.load(f"{textures_path_abs}\\{mask_image_name}")
-            if mask_image:
-                print('mask found')
-                # open image
-                mask_image_path = f"{textures_path_abs}\\{mask_image_name}"
-                print(mask_image_path)
-                mask_image = bpy.data.images.load(mask_image_path)
-                mask_image_node = material_nodes.new(type='ShaderNodeTexImage')
-                mask_image_node.image = mask_image
-                mask_image_node.location[0] -= 600
-                mask_image_node.location[1] -= 300
-                material_links.new(shader.inputs["Alpha"], mask_image_node.outputs["Color"])
-            else:
-                possible_lamp_name_artefacts = ['lamp', 'light']
-                is_lamp = False
-                for ln in possible_lamp_name_artefacts:
-                    is_lamp = is_lamp or ln in dae_name.lower() or ln in o.name.lower()
-                if 'glass' in o.name.lower() and not is_lamp:
-                    # cycles
-                    glass_node_tree = append_node_tree('BotW_Cycles_Glass')
-                    glass_node = material_nodes.new(type='ShaderNodeGroup')
-                    glass_node.node_tree = glass_node_tree
-                    glass_node.location[0] += 300
-
-                    # eevee
-                    default_alpha = .2
-                    # if 'inside' in o.name.lower() or 'outside' in o.name.lower():
-                    #     default_alpha = .25
-                    shader.inputs['Alpha'].default_value = default_alpha
-                    shader.inputs['Transmission'].default_value = 1
-                else:
-                    material_links.new(shader.inputs["Alpha"], base_color.outputs["Alpha"])
-                # make lamps emissive warmer, add lights
-                if 'glass' in o.name.lower() and is_lamp:
-                    print('LAMP DETECTED')
-                    add_normal = False
-                    if emission_image_node:
-                        ramp_tree = append_node_tree('warm_emissive_ramp')
-                        ramp = material_nodes.new(type='ShaderNodeGroup')
-                        ramp.node_tree = ramp_tree
-                        ramp.location[0] -= 250
-                        emission_image_node.location[0] -= 200
-                        material_links.new(ramp.inputs["Fac"], emission_image_node.outputs["Color"])
-                        material_links.new(shader.inputs["Emission"], ramp.outputs["Color"])
-
-                        add_emissive_tree = append_node_tree('AddEmissive')
-                        add_emissive_node = material_nodes.new(type='ShaderNodeGroup')
-                        add_emissive_node.node_tree = add_emissive_tree
-                        add_emissive_node.location[0] += 200
-                        add_emissive_node.location[1] -= 300
-                        material_output.location[0] += 150
-                        material_output_cycles.location[0] += 150
-                        material_links.new(add_emissive_node.inputs["Shader Eevee"], shader.outputs["BSDF Eevee"])
-                        material_links.new(add_emissive_node.inputs["Shader Cycles"], shader.outputs["BSDF Cycles"])
-                        material_links.new(add_emissive_node.inputs["Color"], ramp.outputs["Color"])
-                        material_links.new(material_output.inputs["Surface"], add_emissive_node.outputs["Shader Eevee"])
-                        material_links.new(
-                            material_output_cycles.inputs["Surface"],
-                            add_emissive_node.outputs["Shader Cycles"])
-                    # find center location
-                    # https://blender.stackexchange.com/questions/62040/get-center-of-geometry-of-an-object
-                    # local_bbox_center = 0.125 * sum((Vector(b) for b in o.bound_box), Vector())
-                    # global_bbox_center = o.matrix_world @ local_bbox_center
-
-                    # add lights
-                    # warm_light_color = (1, .639, .366)
-                    # light_local = make_light('light_local', 80, .15, warm_light_color)
-                    # light_local.location = global_bbox_center
-                    # light_global = make_light('light_global', 40, .5, warm_light_color)
-                    # light_global.visible_diffuse = False
-                    # light_global.location = global_bbox_center
-                    lamp_obj = link_lamp('lamp_light')
-                elif is_lamp:
-                    wide2_lamp_names = [
-                        'gerudo_light_a_01',
-                        'gerudo_light_a_02',
-                        'gerudo_light_a_03',
-                    ]
-
-                    wide2 = False
-                    for ln in wide2_lamp_names:
-                        wide2 = wide2 or ln in o.name.lower() or ln in dae_name.lower()
-
-                    # lamp wide 2
-                    if wide2:
-                        lamp_obj = link_lamp('lamp_light_wide2')
-                    # default
-                    else:
-                        lamp_obj = link_lamp('lamp_light_wide1')
-
-            # handle NORMAL, might already be imported
-            normal_image_name = image_stem+"Nrm.png"
-            normal_image = None
-            normal_image_node = None
-            if add_normal:
-                normal_image = bpy.data.images.get(normal_image_name)
-            if add_normal and not normal_image and normals.get(image_stem):
-                normal_image = bpy.data.images.load(f"{textures_path_abs}\\{normal_image_name}")
-            if normal_image:
-                normal_image_node = material_nodes.new(type='ShaderNodeTexImage')
-                normal_image_node.image = normal_image
-                normal_image_node.location[0] -= 600
-                normal_image_node.location[1] -= 300
-                material_links.new(shader.inputs["Normal Color"], normal_image_node.outputs["Color"])
-            else:
-                print('no normals found')
-
-            # handle trs - roughness and specular
-            trs_image_name = image_stem+"Trs.png"
-            trs_image = bpy.data.images.get(trs_image_name)
-            if not trs_image and trs.get(image_stem):
-                trs_image = bpy.data.images.load(f"{textures_path_abs}\\{trs_image_name}")
-            if trs_image:
-                trs_image_node = material_nodes.new(type='ShaderNodeTexImage')
-                trs_image_node.image = trs_image
-                trs_image_node.location[0] -= 600
-                # easy one is roughness
-                material_links.new(shader.inputs["Roughness"], trs_image_node.outputs["Color"])
-                if not specular_node:
-                    material_links.new(shader.inputs["Specular"], trs_image_node.outputs["Color"])
-            else:
-                print('no trs found')
-
-            if 'waterfall' in o.name.lower() or 'lavafall' in o.name.lower():
-                # connect a time node to make the uv move
-                botw_time_tree = append_node_tree('BotW_time')
-                botw_time = material_nodes.new(type='ShaderNodeGroup')
-                botw_time.node_tree = botw_time_tree
-                botw_time.location[0] -= 1050
-                texcoord_node = material_nodes.new(type='ShaderNodeTexCoord')
-                texcoord_node.location[0] -= 850
-                texcoord_node.location[1] += 200
-                combine_node = material_nodes.new(type='ShaderNodeCombineXYZ')
-                combine_node.location[0] -= 850
-                combine_node.location[1] -= 200
-                mapping_node = material_nodes.new(type='ShaderNodeMapping')
-                mapping_node.location[0] -= 650
-                material_links.new(combine_node.inputs["Y"], botw_time.outputs["Value"])
-                material_links.new(mapping_node.inputs["Vector"], texcoord_node.outputs["UV"])
-                material_links.new(mapping_node.inputs["Location"], combine_node.outputs["Vector"])
-                material_links.new(base_color.inputs["Vector"], mapping_node.outputs["Vector"])
-                if normal_image_node:
-                    material_links.new(normal_image_node.inputs["Vector"], mapping_node.outputs["Vector"])
-
-        else:
-            print('no base color found, trying terrain shader')
-            terrain_shader_secondary(o)
+        print('no base color found, trying terrain shader')
+        terrain_shader_secondary(o)
 
         alpha_blend_edges(o, material_nodes, material_links, shader)
-        # extra names to solidify
-        solidify_names = ['house_t']
-        obj_name_lower = o.name.lower()
-        for name in solidify_names:
-            if name in obj_name_lower:
-                solidify_modifier(o)
-
-        if 'cloth' in o.name.lower() or 'cloth' in o.active_material.name.lower():
-            flip_negative_x_uv(o)
+        finish_object(o, material.name)
+
+    # the imported materials that were only a starting point, their first fixed copy keeps the name
+    for material, fixed in first_fixed.items():
+        if material.users == 0:
+            name = material.name
+            bpy.data.materials.remove(material)
+            fixed.name = name
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import queue
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+MESSAGE_PREFIX = '@bmubin_worker '
+"""marks the worker's replies among everything else Blender prints"""
+STARTUP_TIMEOUT = 180
+
+job_ids = itertools.count(1)
+
+
+def send_message(message: dict):
+    """called inside the Blender worker, the leading newline keeps it off the end of a progress bar"""
+    print(f'\n{MESSAGE_PREFIX}{json.dumps(message)}', flush=True)
+
+
+def process_memory_mb() -> float:
+    """resident memory of the current process"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize / (1024 * 1024)
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read_output(stream, messages: queue.Queue, quiet: bool):
+    """forwards the worker's replies to messages, None once Blender exits"""
+    try:
+        for line in stream:
+            index = line.find(MESSAGE_PREFIX)
+            if index >= 0:
+                try:
+                    messages.put(json.loads(line[index + len(MESSAGE_PREFIX):]))
+                except ValueError:
+                    print(f'unreadable worker message {line.strip()}')
+            elif not quiet:
+                line = line.strip()
+                if len(line) > 0 and not 'WARN' in line:
+                    print(line)
+    finally:
+        # whatever stopped the reader, waiting jobs find out the worker is gone instead of timing out
+        messages.put(None)
+
+
+class blender_worker:
+    """one long lived headless Blender running helper.py worker, jobs are json lines over stdin / stdout"""
+
+    def __init__(self, max_jobs: int, max_memory_mb: float, quiet: bool = True):
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.quiet = quiet
+        self.process: subprocess.Popen = None
+        self.messages: queue.Queue = None
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> bool:
+        launch_file = os.path.abspath('starting_scene\\starting_scene.blend')
+        if not os.path.isfile(launch_file):
+            launch_file = None
+        args = (
+            config["blenderPath"],
+            launch_file,
+            '--background',
+            "--python",
+            "helper.py",
+            "--factory-startup",
+            "-y",
+            "--",
+            'worker'
+        )
+        args = tuple(x for x in args if x is not None)
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL if self.quiet else None,
+            universal_newlines=True,
+            # not the locale codec, one byte blender prints that it can't decode would stop read_output
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+        )
+        self.messages = queue.Queue()
+        threading.Thread(target=read_output, args=(self.process.stdout, self.messages, self.quiet), daemon=True).start()
+        self.jobs = 0
+        ready = self.wait_for('ready', STARTUP_TIMEOUT)
+        if not ready or ready.get('status') != 'ready':
+            print('Blender worker failed to start', file=sys.stderr)
+            self.kill()
+            return False
+        return True
+
+    def wait_for(self, job_id, timeout_s: float) -> dict:
+        """the reply to job_id, None if it took longer than timeout_s"""
+        deadline = time.time() + timeout_s
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                message = self.messages.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if message is None:
+                return {'id': job_id, 'status': 'crashed'}
+            if message.get('id') == job_id:
+                return message
+
+    def run(self, func_to_run: str, arg_list: list, timeout_s: float) -> dict:
+        if not self.alive() and not self.start():
+            return {'status': 'crashed'}
+        job = {'id': next(job_ids), 'func': func_to_run, 'args': [str(x) for x in arg_list]}
+        try:
+            self.process.stdin.write(json.dumps(job) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            self.kill()
+            return {'status': 'crashed'}
+
+        result = self.wait_for(job['id'], timeout_s)
+        if result is None:
+            print(f'Timeout for {func_to_run} {arg_list} ({timeout_s}s) expired', file=sys.stderr)
+            self.kill()
+            return {'status': 'timeout', 'seconds': timeout_s}
+        if result['status'] == 'crashed':
+            self.kill()
+            return result
+
+        # restart before Blender's leaks add up, the next job starts a fresh one
+        self.jobs += 1
+        if self.jobs >= self.max_jobs or result.get('memory_mb', 0) > self.max_memory_mb:
+            self.stop()
+        return result
+
+    def stop(self):
+        if not self.alive():
+            return
+        try:
+            self.process.stdin.write(json.dumps({'func': 'quit'}) + '\n')
+            self.process.stdin.flush()
+            self.process.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+            self.process.wait()
+
+
+class blender_pool:
+    """
+    Pool of headless Blender workers that stay open between jobs.
+
+    Each job loads a clean scene instead of starting Blender, workers restart after
+    blenderWorkerJobs jobs or once they use more than blenderWorkerMemoryMB.
+    """
+
+    def __init__(self, size: int = None, quiet: bool = True):
+        size = size or config.get("blenderWorkers") or os.cpu_count() or 1
+        max_jobs = config.get("blenderWorkerJobs") or 50
+        max_memory_mb = config.get("blenderWorkerMemoryMB") or 6144
+        self.idle = queue.Queue()
+        self.workers = [blender_worker(max_jobs, max_memory_mb, quiet) for _ in range(size)]
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self, func_to_run: str, arg_list: list = [], timeout_s: float = 60) -> dict:
+        """runs a helper.py function on the next free worker, returns its status (complete, timeout...) and seconds"""
+        worker: blender_worker = self.idle.get()
+        try:
+            return worker.run(func_to_run, arg_list, timeout_s)
+        finally:
+            self.idle.put(worker)
+
+    def submit(self, func_to_run: str, arg_list: list = [], timeout_s: float = 60):
+        return self.executor.submit(self.run, func_to_run, arg_list, timeout_s)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.stop()
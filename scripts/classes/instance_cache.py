@@ -1,29 +1,234 @@
 import json
+import mmap
+import struct
+import zlib
+import lzma
+import numpy as np
 
 
 class instance_cache:
-    class position:
-        def __init__(self, location: list = [0, 0, 0], rotate: list = [0, 0, 0], scale: list = [1, 1, 1]):
-            self.location = location
-            self.rotate = rotate
-            self.scale = scale
+    class model:
+        """every placement of one model, stored as columns rather than one object per placement"""
 
-        def __str__(self):
-            return json.dumps(self, default=lambda o: o.__dict__)
-            # return vars(self)
-            # return (json.dumps(vars(self), indent=4))
-            # return f'location: {self.location},\nrotation: {self.rotate},\nscale: {self.scale}'
+        # location xyz, rotate xyz, scale xyz
+        width = 9
 
-    class model:
-        def __init__(self, positions=[]):
-            self.positions: list = positions
+        def __init__(self, capacity: int = 16):
+            self.transforms = np.empty((capacity, self.width), dtype=np.float32)
+            self.hash_ids = np.empty(capacity, dtype=np.uint32)
+            self.count = 0
+
+        def __len__(self):
+            return self.count
+
+        def __getstate__(self):
+            # only send the used rows to process pool workers / pickles
+            return {'transforms': self.get_transforms(), 'hash_ids': self.get_hash_ids()}
+
+        def __setstate__(self, state):
+            self.transforms = np.ascontiguousarray(state['transforms'], dtype=np.float32)
+            self.hash_ids = np.ascontiguousarray(state['hash_ids'], dtype=np.uint32)
+            self.count = len(self.hash_ids)
+
+        def reserve(self, extra: int):
+            needed = self.count + extra
+            capacity = len(self.hash_ids)
+            if needed <= capacity:
+                return
+            # grow geometrically so appending one placement at a time stays cheap
+            capacity = max(needed, capacity * 2, 16)
+            transforms = np.empty((capacity, self.width), dtype=np.float32)
+            transforms[:self.count] = self.transforms[:self.count]
+            hash_ids = np.empty(capacity, dtype=np.uint32)
+            hash_ids[:self.count] = self.hash_ids[:self.count]
+            self.transforms = transforms
+            self.hash_ids = hash_ids
+
+        def append(self, hash_id: int, location: list, rotate: list, scale: list):
+            self.reserve(1)
+            row = self.transforms[self.count]
+            row[0:3] = location
+            row[3:6] = rotate
+            row[6:9] = scale
+            self.hash_ids[self.count] = hash_id
+            self.count += 1
+
+        def extend(self, hash_ids, transforms):
+            hash_ids = np.asarray(hash_ids, dtype=np.uint32).reshape(-1)
+            transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, self.width)
+            self.reserve(len(hash_ids))
+            self.transforms[self.count:self.count + len(hash_ids)] = transforms
+            self.hash_ids[self.count:self.count + len(hash_ids)] = hash_ids
+            self.count += len(hash_ids)
+
+        def get_transforms(self) -> np.ndarray:
+            return self.transforms[:self.count]
+
+        def get_hash_ids(self) -> np.ndarray:
+            return self.hash_ids[:self.count]
+
+        def locations(self) -> np.ndarray:
+            return self.transforms[:self.count, 0:3]
+
+        def rotations(self) -> np.ndarray:
+            return self.transforms[:self.count, 3:6]
+
+        def scales(self) -> np.ndarray:
+            return self.transforms[:self.count, 6:9]
+
+        def toJSON(self):
+            return {
+                'HashId': self.get_hash_ids().tolist(),
+                'transforms': self.get_transforms().tolist(),
+            }
+
+        def from_json(data: dict):
+            model = instance_cache.model(0)
+            model.extend(data['HashId'], data['transforms'])
+            return model
 
         def __str__(self):
-            return json.dumps(self, default=lambda o: o.__dict__)
+            return json.dumps(self.toJSON())
 
     def __init__(self):
         # models = {}
-        self.models: dict[str, self.model] = {}
+        self.models: dict[str, instance_cache.model] = {}
+
+    def get_model(self, model_name: str):
+        model = self.models.get(model_name)
+        if model is None:
+            # cache by model name
+            model = instance_cache.model()
+            self.models[model_name] = model
+        return model
+
+    def append(self, model_name: str, hash_id: int, location: list, rotate: list, scale: list):
+        self.get_model(model_name).append(hash_id, location, rotate, scale)
+
+    def extend(self, model_name: str, hash_ids, transforms):
+        self.get_model(model_name).extend(hash_ids, transforms)
 
     def toJSON(self):
-        return json.loads(json.dumps(self, default=lambda o: o.__dict__))
+        return {'models': {name: model.toJSON() for name, model in self.models.items()}}
+
+    def from_json(data: dict):
+        p_cache = instance_cache()
+        for name, model in data['models'].items():
+            p_cache.models[name] = instance_cache.model.from_json(model)
+        return p_cache
+
+
+def dump_instance_caches(caches: dict, file):
+    """writes {mubin name: instance_cache} straight to an open json file"""
+    import ujson
+    # this can be a very big json (20mb) so using ujson
+    ujson.dump({name: p_cache.toJSON() for name, p_cache in caches.items()}, file)
+
+
+# binary instance cache layout
+#   header: magic, version, compression, index length
+#   index: json {mubin: {model: [offset, size, count]}}, offsets are relative to the end of the index
+#   data: per model, count uint32 HashIds followed by count * 9 float32 transforms, optionally compressed
+BINARY_MAGIC = b'BMIC'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHHI')
+COMPRESSION = {'none': 0, 'zlib': 1, 'lzma': 2}
+
+
+def _compress(data: bytes, compression: int) -> bytes:
+    if compression == 1:
+        return zlib.compress(data, 6)
+    if compression == 2:
+        return lzma.compress(data)
+    return data
+
+
+def _decompress(data, compression: int) -> bytes:
+    if compression == 1:
+        return zlib.decompress(data)
+    if compression == 2:
+        return lzma.decompress(data)
+    return data
+
+
+def write_instance_cache_binary(caches: dict, path, compression: str = 'none'):
+    """writes {mubin name: instance_cache} as an indexed binary file the importer can memory map"""
+    compression_id = COMPRESSION.get(compression, 0)
+    index = {}
+    blobs = []
+    offset = 0
+    for mubin, p_cache in caches.items():
+        mubin_index = index[mubin] = {}
+        for model_name, model in p_cache.models.items():
+            blob = model.get_hash_ids().astype('<u4').tobytes() + model.get_transforms().astype('<f4').tobytes()
+            blob = _compress(blob, compression_id)
+            mubin_index[model_name] = [offset, len(blob), len(model)]
+            blobs.append(blob)
+            offset += len(blob)
+            # keep raw arrays 4 byte aligned
+            padding = -offset % 4
+            if padding:
+                blobs.append(b'\0' * padding)
+                offset += padding
+
+    index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+    index_bytes += b' ' * (-(BINARY_HEADER.size + len(index_bytes)) % 4)
+    with open(path, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, compression_id, len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+        f.close()
+
+
+class instance_cache_reader:
+    """memory maps a binary instance cache, models are only read when asked for"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.compression, index_size = BINARY_HEADER.unpack_from(self.map, 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {BINARY_VERSION} binary instance cache')
+        index_start = BINARY_HEADER.size
+        self.index: dict = json.loads(self.map[index_start:index_start + index_size].decode('utf-8'))
+        self.data_start = index_start + index_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def mubins(self) -> list:
+        return list(self.index.keys())
+
+    def models(self, mubin: str) -> list:
+        return list(self.index[mubin].keys())
+
+    def count(self, mubin: str, model_name: str) -> int:
+        """number of placements, without reading them"""
+        return self.index[mubin][model_name][2]
+
+    def get_model(self, mubin: str, model_name: str) -> instance_cache.model:
+        offset, size, count = self.index[mubin][model_name]
+        start = self.data_start + offset
+        blob = _decompress(self.map[start:start + size], self.compression)
+        hash_ids = np.frombuffer(blob, dtype='<u4', count=count)
+        transforms = np.frombuffer(blob, dtype='<f4', count=count * instance_cache.model.width, offset=count * 4)
+        model = instance_cache.model(0)
+        model.extend(hash_ids, transforms)
+        return model
+
+    def get_instance_cache(self, mubin: str) -> instance_cache:
+        p_cache = instance_cache()
+        for model_name in self.index[mubin]:
+            p_cache.models[model_name] = self.get_model(mubin, model_name)
+        return p_cache
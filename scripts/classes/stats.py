@@ -1,10 +1,49 @@
+from collections import Counter
+
+
 class stats:
-    built_assets = {}
-    """dict of built assets"""
+    def __init__(self, built_assets=None):
+        self.built_assets: set = set(built_assets or ())
+        """names of built assets"""
+
+        self.assets_ready = Counter()
+        """assets ready to import: placement count"""
+
+        self.assets_not_found = Counter()
+        """assets we don't have: placement count"""
+
+        self.actors_not_found = Counter()
+        """actors with no known model: placement count"""
+
+        self.mubins = 0
+
+    def add(self, model_counts: Counter, unresolved: Counter = None):
+        """splits one mubin's model counts into ready / not found"""
+        for model_name, count in model_counts.items():
+            if model_name in self.built_assets:
+                self.assets_ready[model_name] += count
+            else:
+                self.assets_not_found[model_name] += count
+        if unresolved:
+            self.actors_not_found.update(unresolved)
+        self.mubins += 1
+
+    def all_assets(self) -> Counter:
+        return self.assets_ready + self.assets_not_found
 
-    assets_ready = {}
-    """dict of assets ready to import"""
+    def top(self, n: int = 10) -> list:
+        return self.all_assets().most_common(n)
 
-    assets_not_found = {}
-    """dict of assets we don't have"""
-    
\ No newline at end of file
+    def toJSON(self, top: int = 10) -> dict:
+        all_assets = self.all_assets()
+        return {
+            'mubins': self.mubins,
+            'assets_ready': dict(self.assets_ready.most_common()),
+            'assets_not_found': dict(self.assets_not_found.most_common()),
+            'actors_not_found': dict(self.actors_not_found.most_common()),
+            'top': [{'name': name, 'count': count} for name, count in all_assets.most_common(top)],
+            'unique_assets': len(all_assets),
+            'missing_unique_assets': len(self.assets_not_found),
+            'total_assets': sum(all_assets.values()),
+            'total_missing_assets': sum(self.assets_not_found.values()),
+        }
@@ -1,4 +1,5 @@
-from oead import Sarc, yaz0
+from oead import Sarc
+from scripts.mubin.io import yaz0_cache
 from pathlib import Path
 import os
 from tqdm import tqdm
@@ -63,7 +64,7 @@ def unpack_file(path: str):
     data = Path(path).read_bytes()
 
     if data[:4] == b'Yaz0':
-        data = yaz0.decompress(data)
+        data = yaz0_cache.decompress(data)
     else:
         print('not yaz0')
         return False
@@ -0,0 +1,90 @@
+import re
+import json
+import hashlib
+from fnmatch import translate
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+DEFAULT_SPEC = {
+    # include, exclude or only _Far actors
+    'far': 'include',
+    # UnitConfigName globs, or regexes prefixed with re:, an empty include list keeps every actor
+    'include': [],
+    'exclude': [],
+    # drop actors whose model isn't built in asset_library\\assets yet
+    'requireBuiltAsset': False,
+}
+
+
+def compile_patterns(patterns: list):
+    """one regex for a list of globs / re: regexes, None if the list is empty"""
+    parts = []
+    for pattern in patterns or []:
+        if pattern.startswith('re:'):
+            parts.append(f'(?:{pattern[3:]})')
+        else:
+            parts.append(f'(?:{translate(pattern)})')
+    if not parts:
+        return None
+    return re.compile('|'.join(parts))
+
+
+class actor_filter:
+    """
+    Declarative filter applied while parsing, before an actor's model is resolved or its transform read.
+
+    Decisions are remembered per actor name, mubins place the same actors over and over.
+    """
+
+    def __init__(self, spec: dict = None, built_assets: set = None):
+        self.spec = dict(DEFAULT_SPEC)
+        self.spec.update(spec or {})
+        if self.spec['far'] not in ('include', 'exclude', 'only'):
+            raise ValueError(f'actorFilter far should be include, exclude or only, got {self.spec["far"]}')
+        self.include = compile_patterns(self.spec['include'])
+        self.exclude = compile_patterns(self.spec['exclude'])
+        self.built_assets = None
+        if self.spec['requireBuiltAsset']:
+            if built_assets is None:
+                from scripts.mubin.get_stats import find_built_assets
+                built_assets = find_built_assets()
+            self.built_assets = set(built_assets)
+        self.names: dict = {}
+        """actor name: allowed"""
+
+    def from_config(import_far: bool = True):
+        spec = dict(config.get("actorFilter") or {})
+        if not import_far:
+            spec['far'] = 'exclude'
+        return actor_filter(spec)
+
+    def allows_name(self, name: str) -> bool:
+        allowed = self.names.get(name)
+        if allowed is None:
+            allowed = self.check_name(name)
+            self.names[name] = allowed
+        return allowed
+
+    def check_name(self, name: str) -> bool:
+        far = name.endswith('_Far')
+        if self.spec['far'] == 'exclude' and far:
+            return False
+        if self.spec['far'] == 'only' and not far:
+            return False
+        if self.include and not self.include.fullmatch(name):
+            return False
+        if self.exclude and self.exclude.fullmatch(name):
+            return False
+        return True
+
+    def allows_model(self, model_name: str) -> bool:
+        return self.built_assets is None or model_name in self.built_assets
+
+    def signature(self) -> dict:
+        """what the filter keeps, for the cache manifest"""
+        signature = {'spec': self.spec}
+        if self.built_assets is not None:
+            assets = '\n'.join(sorted(self.built_assets)).encode('utf-8')
+            signature['built_assets'] = hashlib.sha1(assets).hexdigest()
+        return signature
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from scripts.classes.instance_cache import instance_cache
+from scripts.classes.instance_cache import instance_cache_reader
+from scripts.classes.instance_cache import write_instance_cache_binary
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+manifest_path = 'linked_resources\\json\\generated\\instance_cache_manifest.json'
+mubin_cache_directory = 'linked_resources\\json\\generated\\instance_caches\\mubins'
+MANIFEST_VERSION = 1
+
+
+def file_hash(path) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_entry(path, previous: dict = None) -> dict:
+    """size, mtime and content hash of a file, the hash is only recomputed if size or mtime changed"""
+    if not Path(path).is_file():
+        return None
+    stat = os.stat(path)
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if previous and previous.get('size') == entry['size'] and previous.get('mtime') == entry['mtime']:
+        entry['hash'] = previous.get('hash')
+    else:
+        entry['hash'] = file_hash(path)
+    return entry
+
+
+class cache_manifest:
+    """tracks which mubins have already been parsed so only new or changed ones are parsed again"""
+
+    def __init__(self, data: dict = None):
+        data = data or {}
+        self.sources: dict = data.get('sources', {})
+        """exported.json / cache.json entries the cached mubins were resolved against"""
+        self.signature: dict = data.get('signature', {})
+        """parse settings the cached mubins were made with"""
+        self.mubins: dict = data.get('mubins', {})
+        """absolute mubin path: size, mtime, hash and the per mubin cache file"""
+        if data.get('version') != MANIFEST_VERSION:
+            self.mubins = {}
+        self.pending: dict = {}
+        """entries hashed by stale_mubins, waiting for store"""
+
+    def load():
+        if not Path(manifest_path).is_file():
+            return cache_manifest()
+        try:
+            return cache_manifest(json.loads(Path(manifest_path).read_text()))
+        except ValueError:
+            print('instance cache manifest unreadable, caching every mubin')
+            return cache_manifest()
+
+    def save(self):
+        data = {
+            'version': MANIFEST_VERSION,
+            'sources': self.sources,
+            'signature': self.signature,
+            'mubins': self.mubins,
+        }
+        Path(manifest_path).write_text(json.dumps(data, indent=4))
+
+    def check_sources(self, signature: dict = None):
+        """drops every cached mubin if the actor data or parse settings changed"""
+        data_dir = os.path.abspath(config["dataDir"])
+        sources = {}
+        for name in ['exported.json', 'cache.json']:
+            sources[name] = file_entry(f'{data_dir}\\{name}', self.sources.get(name))
+        signature = signature or {}
+
+        def hashes(entries):
+            return {k: v and v.get('hash') for k, v in entries.items()}
+
+        if hashes(sources) != hashes(self.sources) or signature != self.signature:
+            if self.mubins:
+                print('actor data or parse settings changed, caching every mubin')
+            self.mubins = {}
+        self.sources = sources
+        self.signature = signature
+
+    def stale_mubins(self, mubin_paths: list) -> list:
+        """returns the mubins that are new or changed since they were last cached"""
+        stale = []
+        for mubin_path in mubin_paths:
+            key = os.path.abspath(mubin_path)
+            previous = self.mubins.get(key)
+            entry = file_entry(key, previous)
+            if not previous or not entry or entry['hash'] != previous.get('hash') \
+                    or not Path(previous.get('cache', '')).is_file():
+                stale.append(mubin_path)
+                self.pending[key] = entry
+                continue
+            # touched but not changed, remember the new mtime so it isn't hashed again
+            previous.update(entry)
+        return stale
+
+    def store(self, mubin_path, p_cache: instance_cache):
+        key = os.path.abspath(mubin_path)
+        stem = Path(key).stem
+        if not Path(mubin_cache_directory).is_dir():
+            Path(mubin_cache_directory).mkdir(parents=True)
+        # stems can repeat across map directories so include a bit of the path
+        path_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        cache_path = os.path.abspath(f'{mubin_cache_directory}\\{stem}_{path_hash}.bin')
+        write_instance_cache_binary({stem: p_cache}, cache_path)
+        entry = self.pending.pop(key, None) or file_entry(key)
+        entry['cache'] = cache_path
+        self.mubins[key] = entry
+
+    def load_mubin(self, mubin_path) -> instance_cache:
+        entry = self.mubins[os.path.abspath(mubin_path)]
+        with instance_cache_reader(entry['cache']) as reader:
+            return reader.get_instance_cache(reader.mubins()[0])
@@ -0,0 +1,79 @@
+import numpy as np
+from scripts.classes.instance_cache import instance_cache
+
+QUANTUM = 0.01
+"""transforms closer than this on every axis count as the same placement"""
+
+
+def section_of(stem: str) -> str:
+    """A-1_Static and A-1_Dynamic are the same map section"""
+    for suffix in ('_Static', '_Dynamic'):
+        if stem.endswith(suffix):
+            return stem[:-len(suffix)]
+    return stem
+
+
+def first_rows(keys: np.ndarray) -> np.ndarray:
+    """True for the first row of every distinct key, in row order"""
+    keep = np.zeros(len(keys), dtype=bool)
+    if len(keys):
+        _, first = np.unique(keys, axis=0, return_index=True)
+        keep[first] = True
+    return keep
+
+
+def dedup_caches(p_caches: dict, quantum: float = QUANTUM) -> dict:
+    """
+    drops placements that an earlier mubin or model already has, in place. {stem: instance_cache} in mubin order,
+    every mubin is checked against every other so duplicates across sections and prefixes go too.
+
+    A placement is a duplicate if an earlier one has the same non zero HashId. Placements without a HashId
+    are duplicates if an earlier one without a HashId has the same model and quantized transform.
+    Returns {stem: duplicates removed}.
+    """
+    model_lookup = {}
+    rows = []
+    for mubin_id, (stem, p_cache) in enumerate(p_caches.items()):
+        for model_name, model in p_cache.models.items():
+            if not len(model):
+                continue
+            model_id = model_lookup.setdefault(model_name, len(model_lookup))
+            rows.append((mubin_id, stem, model_name, model_id, model))
+
+    removed = {stem: 0 for stem in p_caches}
+    if not rows:
+        return removed
+
+    hash_ids = np.concatenate([model.get_hash_ids() for *_, model in rows])
+    transforms = np.concatenate([model.get_transforms() for *_, model in rows])
+    model_ids = np.concatenate([np.full(len(model), model_id, dtype=np.int64) for *_, model_id, model in rows])
+
+    # HashIds are unique per placement in the game, 0 means the mubin didn't have one
+    keep = np.ones(len(hash_ids), dtype=bool)
+    has_hash = hash_ids != 0
+    keep[has_hash] = first_rows(hash_ids[has_hash, None])
+
+    # without a HashId the same model at the same spot is the best match there is
+    no_hash = np.flatnonzero(~has_hash)
+    if len(no_hash):
+        quantized = np.round(transforms[no_hash] / quantum).astype(np.int64)
+        keys = np.concatenate((model_ids[no_hash, None], quantized), axis=1)
+        keep[no_hash] = first_rows(keys)
+
+    if keep.all():
+        return removed
+
+    start = 0
+    for mubin_id, stem, model_name, model_id, model in rows:
+        end = start + len(model)
+        model_keep = keep[start:end]
+        if not model_keep.all():
+            removed[stem] += int(len(model) - model_keep.sum())
+            deduped = instance_cache.model(0)
+            deduped.extend(model.get_hash_ids()[model_keep], model.get_transforms()[model_keep])
+            if len(deduped):
+                p_caches[stem].models[model_name] = deduped
+            else:
+                del p_caches[stem].models[model_name]
+        start = end
+    return removed
@@ -1,153 +1,94 @@
-import bpy
-import traceback
-import time
-from pathlib import Path
-import json
+import os
 import sys
-import contextlib
-from tqdm import tqdm
+import json
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from scripts.classes.stats import stats
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
 
+stats_path = 'linked_resources\\json\\generated\\mubin_stats.json'
 
-class DummyFile(object):
-    # https://stackoverflow.com/questions/36986929/redirect-print-command-in-python-script-through-tqdm-write/37243211#37243211
-    file = None
-
-    def __init__(self, file):
-        self.file = file
 
-    def write(self, x): pass
-    # Avoid print() second call (useless \n)
-    # if len(x.rstrip()) > 0:
-    #     tqdm.write(x, file=self.file)
+def find_built_assets(directory: str = 'asset_library\\assets') -> set:
+    built_assets = set()
+    for dirpath, dirnames, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.blend'):
+                built_assets.add(name[:-6])
+    return built_assets
 
-    def flush(self): pass
 
+def count_models(mubin_path: str, import_far: bool = True) -> tuple:
+    """(model name counts, unresolved actor counts) for one mubin, top level so process pool workers can run it"""
+    from .io.open_oead import OpenOead
+    from .io.byml_stream import BymlStream
+    from .mod_index import model_names_for
+    model_names = model_names_for(mubin_path)
+    data = BymlStream(OpenOead.decompressed_path(mubin_path))
+    models = Counter()
+    unresolved = Counter()
+    if not data.is_mubin():
+        return models, unresolved
+
+    # count by actor name first, most mubins place the same few actors over and over
+    names = Counter(actor.get('UnitConfigName') for actor in data.iter_projected('Objs', ('UnitConfigName',)))
+    names.pop(None, None)
+    for name, count in names.items():
+        if not import_far and name.endswith('_Far'):
+            continue
+        model_name = model_names.get(name)
+        if model_name:
+            models[model_name] += count
+        else:
+            unresolved[name] += count
+    return models, unresolved
 
-@contextlib.contextmanager
-def nostdout():
-    save_stdout = sys.stdout
-    sys.stdout = DummyFile(sys.stdout)
-    yield
-    sys.stdout = save_stdout
 
+def mubin_stats(mubin: Path, import_far, stats: stats):
+    stats.add(*count_models(str(mubin), import_far))
 
-def import_actor(actor: dict, mod_folder: str, cache={}, exported={}, data_dir='', stats={}):
-    # lightweight version of import.py designed to just retrieve statistics on assets and asset availability
-    # print('fake import actor')
-    from .io.data import Data
-    """Imports a mubin actor entry using the cached models and relative sbfres files."""
 
-    name = actor['UnitConfigName']
-    dae_file = ''
+def collect_stats(mubin_paths: list, built_assets: set = None, import_far: bool = True, workers: int = None) -> stats:
+    """counts ready / missing assets over every mubin, in a process pool unless workers is 1"""
+    if built_assets is None:
+        built_assets = find_built_assets()
+    result = stats(built_assets)
+    mubin_paths = [str(p) for p in mubin_paths]
+    if workers == 1 or len(mubin_paths) < 2:
+        for mubin_path in mubin_paths:
+            result.add(*count_models(mubin_path, import_far))
+        return result
 
-    # Vanilla actor
-    if name in exported:
-        dae_file = f'{data_dir}\\collada\\{exported[name]["BfresName"]}\\{exported[name]["ModelName"]}.dae'
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = pool.map(count_models, mubin_paths, [import_far] * len(mubin_paths), chunksize=8)
+        for models, unresolved in counts:
+            result.add(models, unresolved)
+    return result
 
-    # Custom actor already cached
-    elif name in cache:
-        dae_file = f'{data_dir}\\cache\\{cache[name]["BfresName"]}\\{cache[name]["ModelName"]}.dae'
 
-    # Custom actor
-    elif Path(f'{mod_folder}\\content\\Actor\\Pack\\{name}.sbactorpack').is_file():
-        Data.cache_actor(Path(f'{mod_folder}\\content\\Actor\\Pack\\{name}.sbactorpack'))
-        dae_file = f'{data_dir}\\bin\\{cache[name]["BfresName"]}\\{cache[name]["ModelName"]}.dae'
+def write_stats(result: stats, path: str = stats_path, top: int = 10) -> dict:
+    stats_json = result.toJSON(top)
+    with open(path, 'w') as f:
+        json.dump(stats_json, f, indent=4)
+    return stats_json
 
-    # Actor not found
-    else:
-        print(f'A model for {name}: {actor["HashId"]} could not be found.')
-        return
 
-    model_name = Path(dae_file).stem
-
-    if not stats.built_assets.get(model_name):
-        if not stats.assets_not_found.get(model_name):
-            stats.assets_not_found[model_name] = 1
+def main():
+    # python -m scripts.mubin.get_stats <mubin or directory> ..., no blender needed
+    mubin_paths = []
+    for arg in sys.argv[1:]:
+        if Path(arg).is_dir():
+            mubin_paths += [str(p) for p in Path(arg).rglob('*.smubin')]
         else:
-            stats.assets_not_found[model_name] += 1
+            mubin_paths.append(arg)
+    if not mubin_paths:
+        print('try calling get_stats with mubin paths or a directory')
         return
-
-    if not stats.assets_ready.get(model_name):
-        stats.assets_ready[model_name] = 1
-    else:
-        stats.assets_ready[model_name] += 1
-    return
-
-
-def mubin_stats(mubin: Path, import_far, stats, find_actor = None):
-    from .io.open_oead import OpenOead
-    from .io.data import Data
-    context = bpy.context
-    Data.init()
-    data_dir = config["dataDir"]
-    cache = Data.cache
-    exported = Data.exported
-    data = OpenOead.from_path(mubin)
-
-    content = ''
-    num = range(0)
-    # find the content directory which should be part of the mubin's path
-    for i in num:
-        if Path(f'{mubin}{".//" * (i + 1)}/content').is_dir():
-            content = f'{mubin}{"..//" * (i + 1)}/content'
-            break
-        num = range(i + 1)
-
-    if data.type == 'BYML' and data.sub_type == 'MUBIN':
-        start_time = time.time()
-        tqdm_args = {
-            'leave': False,
-            'dynamic_ncols': True,
-            'colour': 'yellow',
-            'position': 0,
-            'desc': 'Actors',
-            'file': sys.stdout
-        }
-        # for actor in data.content['Objs']:
-        for actor in tqdm(data.content['Objs'], **tqdm_args):
-            with nostdout():
-                print(f'name:{actor["UnitConfigName"]} hashid:{actor["HashId"]}')
-                if find_actor:
-                    name = actor["UnitConfigName"]
-                    vanilla_actor = exported.get(name)
-                    if not vanilla_actor:
-                        continue
-                    model_name = vanilla_actor.get("ModelName")
-                    if not model_name:
-                        continue
-                    if find_actor.lower() in model_name.lower():
-                        return model_name
-                    if find_actor.lower() in name.lower():
-                        return name
-                try:
-                    if str(actor["UnitConfigName"]).endswith('_Far'):
-                        if import_far:
-                            import_actor(actor, f'{content}..\\', cache=cache,
-                                         exported=exported, data_dir=data_dir, stats=stats)
-                    else:
-                        import_actor(actor, f'{content}..\\', cache=cache,
-                                     exported=exported, data_dir=data_dir, stats=stats)
-                except:
-                    print(f'Could not import {actor["UnitConfigName"]}\n{traceback.format_exc()}')
-
-                    error = ''
-                    if Path(f'{data_dir}\\error.txt').is_file():
-                        error = Path(f'{data_dir}\\error.txt').read_text()
-
-                    Path(f'{data_dir}\\error.txt').write_text(
-                        f'{error}Could not import {actor["UnitConfigName"]}\n{traceback.format_exc()}{"- " * 30}\n')
-
-        end_time = time.time()
-        sec = end_time - start_time
-        # print(f'\nCompleted in {sec} seconds.')
-    return
-
-
-def main():
-    print('try calling mubin_stats with a path')
+    result = collect_stats(mubin_paths, workers=config.get("cacheWorkers") or None)
+    print(json.dumps(result.toJSON(), indent=4))
     return
 
 
@@ -3,6 +3,7 @@ import bpy
 from pathlib import Path
 import json
 from scripts.classes.instance_cache import instance_cache
+from scripts.classes.instance_cache import instance_cache_reader
 import sys
 import contextlib
 from tqdm import tqdm
@@ -42,6 +43,14 @@ layer_collection_cache = {}
 model_instance_counter = {}
 
 
+def reset():
+    """forgets the previous scene's collections, a pooled Blender worker imports more than once"""
+    global vl_collections
+    vl_collections = bpy.context.scene.view_layers["ViewLayer"].layer_collection
+    layer_collection_cache.clear()
+    model_instance_counter.clear()
+
+
 def include_all_collections():
     exclude_all_collection_view_layer(vl_collections, False)
 
@@ -70,9 +79,11 @@ def exclude_collection(layer_collection_name, exclude=True):
     layer_collection_cache[layer_collection_name].exclude = exclude
 
 
-def add_collection(name, parent=bpy.context.scene.collection):
+def add_collection(name, parent=None):
     # print(f'{name}, {parent}')
     context = bpy.context
+    if parent is None:
+        parent = context.scene.collection
     if name not in context.blend_data.collections:
         # print(f'adding collection {name}')
         # if parent is a layer collection get the collection it wraps
@@ -127,9 +138,11 @@ def set_render_mode(layer_collection_name, viewport=False):
         layer_collection_cache[layer_collection_name].collection.hide_render = True
 
 
-def import_all_mubins(prefix: str = ''):
+def import_all_mubins(prefix: str = '', root_name: str = None):
+    """root_name puts the prefix collections under one collection, a shard blend is linked by that name"""
     print('import_all_mubins')
     start_time = time.time()
+    reset()
 
     # Add collections for the asset imports
     col_assets_to_instance = add_collection('Assets')
@@ -144,26 +157,29 @@ def import_all_mubins(prefix: str = ''):
         'desc': 'Mubin',
         'position': 0
     }
-    # for mubin, mubin_data in all_caches.items():
-    with open(f"linked_resources\\json\\generated\\instance_caches\\{prefix}_instance_cache.json", "r") as f:
-        all_caches: dict = json.load(f)
-    for mubin, mubin_data in tqdm(all_caches.items(), **tqdm_args):
+    # only the mubins and models that get instanced are read out of the memory mapped cache
+    reader = instance_cache_reader(f"linked_resources\\json\\generated\\instance_caches\\{prefix}_instance_cache.bin")
+    for mubin in tqdm(reader.mubins(), **tqdm_args):
         mubin_prefix = mubin[:3]
-        coll_mn_prefix = add_collection(mubin_prefix)
+        coll_mn_prefix = add_collection(mubin_prefix, add_collection(root_name) if root_name else None)
         coll_mn = add_collection(mubin, coll_mn_prefix)
 
-        models: dict = mubin_data['models']
-        # for key, val in models.items():
+        model_names = reader.models(mubin)
+        # for key in model_names:
         tqdm_args['position'] = 1
         tqdm_args['colour'] = 'green'
         tqdm_args['desc'] = 'Models Instanced'
-        for key, val in tqdm(models.items(), **tqdm_args):
+        for key in tqdm(model_names, **tqdm_args):
             key: str = key
-            val: instance_cache.model = val
             parent_collection = add_collection(f'{mubin}_Instances', coll_mn)
             if key.endswith('_Far'):
                 parent_collection = add_collection(f'{mubin}_Instances_Far', coll_mn)
-            instantiate_assets(mubin, key, val['positions'], parent_collection)
+            # skip reading placements for assets that aren't built
+            if link_asset(key) is not True:
+                continue
+            val: instance_cache.model = reader.get_model(mubin, key)
+            instantiate_assets(mubin, key, val, parent_collection)
+    reader.close()
 
     # include_all_collections()
     # include only far lod for intially lightweight viewport, make it one-click easy to enable detailed
@@ -181,11 +197,8 @@ def import_all_mubins(prefix: str = ''):
     print(f'\nCompleted in {sec} seconds.')
 
 
-def instantiate_assets(mubin_name, model_name, positions, parent_collection):
-    link_success = link_asset(model_name)
-    if not link_success:
-        return
-
+def instantiate_assets(mubin_name, model_name, positions: instance_cache.model, parent_collection):
+    # the asset should already be linked by link_asset
     model_asset = bpy.data.objects.get(model_name)
     if not model_asset:
         print(f'WARNING: {model_asset} not found')
@@ -194,11 +207,11 @@ def instantiate_assets(mubin_name, model_name, positions, parent_collection):
     new_collection_name = f'{mubin_name}_{model_name}'
     link_to_this_coll: bpy.types.Collection = add_collection(new_collection_name, parent_collection).collection
 
-    for pos in positions:
+    for transform in positions.get_transforms().tolist():
         # print(model_instance_counter)
-        location = pos['location']
-        rotate = pos['rotate']
-        scale = pos['scale']
+        location = transform[0:3]
+        rotate = transform[3:6]
+        scale = transform[6:9]
 
         model_copy: bpy.types.Object = model_asset.copy()
 
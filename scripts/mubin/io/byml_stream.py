@@ -0,0 +1,158 @@
+import struct
+
+# node types
+STRING = 0xA0
+ARRAY = 0xC0
+HASH = 0xC1
+STRING_TABLE = 0xC2
+BOOL = 0xD0
+INT = 0xD1
+FLOAT = 0xD2
+UINT = 0xD3
+INT64 = 0xD4
+UINT64 = 0xD5
+DOUBLE = 0xD6
+NULL = 0xFF
+
+OBJ_FIELDS = ('UnitConfigName', 'HashId', 'Translate', 'Rotate', 'Scale')
+"""the fields caching needs, !Parameters, LinksToObj etc. are only read if asked for"""
+
+
+class BymlStream:
+    """
+    Reads values straight out of a decompressed BYML buffer without building the whole tree.
+
+    Only the nodes that are asked for get decoded, everything else is skipped by offset.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        if bytes(self.data[:2]) == b'BY':
+            endian = '>'
+        elif bytes(self.data[:2]) == b'YB':
+            endian = '<'
+        else:
+            raise ValueError('not a BYML file')
+        self.big_endian = endian == '>'
+        self.u16 = struct.Struct(f'{endian}H')
+        self.u32 = struct.Struct(f'{endian}I')
+        self.s32 = struct.Struct(f'{endian}i')
+        self.f32 = struct.Struct(f'{endian}f')
+        self.u64 = struct.Struct(f'{endian}Q')
+        self.s64 = struct.Struct(f'{endian}q')
+        self.f64 = struct.Struct(f'{endian}d')
+        self.entry = struct.Struct(f'{endian}II')
+
+        self.version = self.u16.unpack_from(self.data, 2)[0]
+        key_table, string_table, self.root = struct.unpack_from(f'{endian}III', self.data, 4)
+        self.keys = self.read_string_table(key_table)
+        self.strings = self.read_string_table(string_table)
+        self.key_indices = {key: i for i, key in enumerate(self.keys)}
+
+    def u24(self, offset: int) -> int:
+        b = self.data[offset:offset + 3]
+        if self.big_endian:
+            return (b[0] << 16) | (b[1] << 8) | b[2]
+        return b[0] | (b[1] << 8) | (b[2] << 16)
+
+    def read_string_table(self, offset: int) -> list:
+        if not offset or self.data[offset] != STRING_TABLE:
+            return []
+        count = self.u24(offset + 1)
+        offsets = struct.unpack_from(f'{">" if self.big_endian else "<"}{count + 1}I', self.data, offset + 4)
+        table = []
+        for i in range(count):
+            start = offset + offsets[i]
+            end = offset + offsets[i + 1]
+            # strip the null terminator
+            table.append(bytes(self.data[start:end]).split(b'\0', 1)[0].decode('utf-8'))
+        return table
+
+    def hash_entries(self, offset: int):
+        """yields (key index, node type, raw value) for a hash node"""
+        count = self.u24(offset + 1)
+        entries = self.entry.iter_unpack(self.data[offset + 4:offset + 4 + count * 8])
+        # the key index is a u24 and the type is always the 4th byte, so how they pack into a u32 depends on endian
+        if self.big_endian:
+            for packed, value in entries:
+                yield packed >> 8, packed & 0xFF, value
+        else:
+            for packed, value in entries:
+                yield packed & 0xFFFFFF, packed >> 24, value
+
+    def array_entries(self, offset: int):
+        """yields (node type, raw value) for an array node"""
+        count = self.u24(offset + 1)
+        types = self.data[offset + 4:offset + 4 + count]
+        values = struct.unpack_from(f'{">" if self.big_endian else "<"}{count}I', self.data,
+                                    offset + 4 + ((count + 3) & ~3))
+        return zip(types, values)
+
+    def value(self, node_type: int, raw: int):
+        """decodes a node, containers are decoded recursively"""
+        if node_type == FLOAT:
+            return self.f32.unpack(self.u32.pack(raw))[0]
+        if node_type == STRING:
+            return self.strings[raw]
+        if node_type == UINT:
+            return raw
+        if node_type == INT:
+            return self.s32.unpack(self.u32.pack(raw))[0]
+        if node_type == BOOL:
+            return raw != 0
+        if node_type == ARRAY:
+            return [self.value(t, v) for t, v in self.array_entries(raw)]
+        if node_type == HASH:
+            return {self.keys[k]: self.value(t, v) for k, t, v in self.hash_entries(raw)}
+        if node_type == INT64:
+            return self.s64.unpack_from(self.data, raw)[0]
+        if node_type == UINT64:
+            return self.u64.unpack_from(self.data, raw)[0]
+        if node_type == DOUBLE:
+            return self.f64.unpack_from(self.data, raw)[0]
+        if node_type == NULL:
+            return None
+        raise ValueError(f'unsupported BYML node type {hex(node_type)}')
+
+    def root_entries(self) -> dict:
+        """key: (node type, raw value) of the root hash"""
+        if not self.root or self.data[self.root] != HASH:
+            return {}
+        return {self.keys[k]: (t, v) for k, t, v in self.hash_entries(self.root)}
+
+    def is_mubin(self) -> bool:
+        root = self.root_entries()
+        return 'Objs' in root and 'Rails' in root
+
+    def iter_projected(self, key: str, fields=OBJ_FIELDS, name_filter=None):
+        """
+        yields a dict of only the requested fields for each hash in the root level array named key.
+        name_filter is called with the UnitConfigName first, the other fields are only decoded if it returns True
+        """
+        root = self.root_entries()
+        if key not in root or root[key][0] != ARRAY:
+            return
+        wanted = {self.key_indices[f]: f for f in fields if f in self.key_indices}
+        name_key = self.key_indices.get('UnitConfigName')
+        for node_type, offset in self.array_entries(root[key][1]):
+            if node_type != HASH:
+                continue
+            entries = self.hash_entries(offset)
+            if name_filter is not None:
+                # keys are sorted, UnitConfigName is near the end so look it up before decoding anything
+                entries = list(entries)
+                name = next((self.value(t, v) for k, t, v in entries if k == name_key), None)
+                if name is None or not name_filter(name):
+                    continue
+            obj = {}
+            for k, t, v in entries:
+                name = wanted.get(k)
+                if name is not None:
+                    obj[name] = self.value(t, v)
+            yield obj
+
+
+def iter_objs(data: bytes, fields=OBJ_FIELDS, extra_fields=()):
+    """yields the projected fields of every mubin Obj in a decompressed BYML buffer"""
+    stream = BymlStream(data)
+    yield from stream.iter_projected('Objs', tuple(fields) + tuple(extra_fields))
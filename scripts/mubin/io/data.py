@@ -1,11 +1,26 @@
 import os
 import json
+import pickle
 # import subprocess
 from pathlib import Path
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
 
+SNAPSHOT_VERSION = 1
+
+
+def source_signature(paths: list) -> list:
+    signature = []
+    for path in paths:
+        if Path(path).is_file():
+            stat = os.stat(path)
+            signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+        else:
+            signature.append((str(path), None, None))
+    return signature
+
+
 class Data:
     """Cached actors"""
 
@@ -24,54 +39,61 @@ class Data:
     # layer_collection_tracker = {}
     """dict of imported assets"""
 
+    model_names = {}
+    """UnitConfigName: model name, exported actors take priority over cached ones"""
+
+    signature = None
+    """size and mtime of exported.json and cache.json when they were loaded"""
+
     def init():
+        """loads the actor data once per process, again only if exported.json or cache.json changed"""
         # Data.data_dir = json.loads(Path(f'{os.environ["LOCALAPPDATA"]}\\mubin_importer\\config.json').read_text())['data_dir']
         data_dir = os.path.abspath(config["dataDir"])
-        Data.exported = json.loads(Path(f'{data_dir}\\exported.json').read_text())
-        Data.cache = json.loads(Path(f'{data_dir}\\cache.json').read_text())
-
-    def cache_actor(actorname, mod_dir) -> dict:
-        from .open_oead import OpenOead
-        """Caches an actor from an actorpack file"""
-
-        # Check for existing entry
-        if actorname.name in Data.cache:
+        exported_path = f'{data_dir}\\exported.json'
+        cache_path = f'{data_dir}\\cache.json'
+        snapshot_path = Path(f'{data_dir}\\resolver_snapshot.pickle')
+        signature = source_signature([exported_path, cache_path])
+        if signature == Data.signature:
             return
 
-        # Look for actorpack
-        actorpack = Path(f'{mod_dir}\\Actor\\Pack\\{actorname}.sbactorpack')
-        if not actorpack.is_file():
-            print(f'No binary actor pack (bactorpack) for {actorname} could be found.')
-            return
+        # a pickled snapshot is much faster to load than the 1.6mb exported.json
+        if snapshot_path.is_file():
+            try:
+                snapshot = pickle.loads(snapshot_path.read_bytes())
+                if snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('signature') == signature:
+                    Data.exported = snapshot['exported']
+                    Data.cache = snapshot['cache']
+                    Data.model_names = snapshot['model_names']
+                    Data.signature = signature
+                    return
+            except Exception:
+                print('resolver snapshot unreadable, rebuilding')
 
-        # Parse SARC file
-        data = OpenOead.from_path(actorpack)
-        if data['type'] == 'SARC':
-            for SARCFile in data['content']:
-                if str(SARCFile).endswith('.bmodellist'):
-                    modellist = OpenOead.from_bytes(SARCFile.data)
-                    model_data = modellist.lists["ModelData"].lists["ModelData_0"]
-                    unit_name = model_data.lists["Unit"].objects["Unit_0"].params["UnitName"]
-                    folder_name = model_data.objects["Base"].params["Folder"]
-                    data.cache[actorname] = {
-                        "DisplayName": actorname.name,
-                        "BfresName": folder_name,
-                        "ModelName": unit_name,
-                    }
-
-        # Check and extract sbfres
-        if not Path(f'{mod_dir}\\content\\Model\\{folder_name}.sbfres').is_file():
-            print(f'No binary cafe resource (bfres) file for {actorname} could be found.')
-            return
+        Data.exported = json.loads(Path(exported_path).read_text())
+        Data.cache = {}
+        if Path(cache_path).is_file():
+            Data.cache = json.loads(Path(cache_path).read_text())
+        Data.build_model_names()
+        Data.signature = signature
+
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'signature': signature,
+            'exported': Data.exported,
+            'cache': Data.cache,
+            'model_names': Data.model_names,
+        }
+        try:
+            snapshot_path.write_bytes(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            print(f'could not write {snapshot_path}')
 
-        # subprocess.run(
-        #     args=[
-        #         f'"{config["data_dir"]}\\lib\\SbfresExtracter.exe"',
-        #         f'"{mod_dir}\\content\\Model\\{folder_name}.sbfres"',
-        #         f'"{mod_dir}\\content\\Model\\{folder_name}Tex1.sbfres"',
-        #         f'"{folder_name}"'
-        #     ],
-        #     capture_output=True
-        # )
-
-        Path(f'{data.data_dir}\\cache.json').write_text(json.dumps(data.cache, indent=4))
\ No newline at end of file
+    def build_model_names():
+        model_names = {}
+        for name, actor in Data.cache.items():
+            if actor.get("ModelName"):
+                model_names[name] = actor["ModelName"]
+        for name, actor in Data.exported.items():
+            if actor.get("ModelName"):
+                model_names[name] = actor["ModelName"]
+        Data.model_names = model_names
@@ -37,7 +37,7 @@ class OpenOead:
 
         if data[:4] == b'Yaz0':
             oead_file.is_yaz0 = True
-            data = yaz0.decompress(data)
+            data = OpenOead.decompress(data)
 
         if data[:2] == b'BY' or b'YB':
             # Set type
@@ -71,4 +71,15 @@ class OpenOead:
         return oead_file
 
     def from_path(path) -> OEADFile:
-        return OpenOead.from_bytes(Path(path).read_bytes())
\ No newline at end of file
+        return OpenOead.from_bytes(Path(path).read_bytes())
+
+    def decompress(data: bytes) -> bytes:
+        """Returns the Yaz0 decompressed bytes, or the bytes unchanged if they aren't compressed."""
+        if data[:4] == b'Yaz0':
+            # shared on disk cache, repeated stats / search runs skip decompression
+            from scripts.mubin.io import yaz0_cache
+            return yaz0_cache.decompress(data)
+        return data
+
+    def decompressed_path(path) -> bytes:
+        return OpenOead.decompress(Path(path).read_bytes())
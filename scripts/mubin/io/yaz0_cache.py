@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from oead import yaz0
+
+with open("mbconfig.json", "r") as f:
+    config = json.load(f)
+
+# content addressed, so every reader (parser, stats, map unpacker) shares the same entries
+cache_directory = f'{os.path.abspath(config["dataDir"])}\\cache\\yaz0'
+max_cache_bytes = int(config.get("yaz0CacheMB", 2048)) * 1024 * 1024
+
+cache_size = None
+"""running total of the cache directory size for this process, None until first scanned"""
+
+
+def cache_entries() -> list:
+    entries = []
+    if not Path(cache_directory).is_dir():
+        return entries
+    for entry in os.scandir(cache_directory):
+        if entry.is_file() and entry.name.endswith('.bin'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    return entries
+
+
+def evict(incoming: int):
+    """removes the least recently used entries until the new one fits under the size cap"""
+    global cache_size
+    if cache_size is None:
+        cache_size = sum(size for _, size, _ in cache_entries())
+    cache_size += incoming
+    if cache_size <= max_cache_bytes:
+        return
+    # other processes may have added or removed entries, rescan before deleting anything
+    entries = sorted(cache_entries())
+    cache_size = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if cache_size <= max_cache_bytes:
+            break
+        try:
+            os.remove(path)
+            cache_size -= size
+        except OSError:
+            # in use by another reader or already gone
+            pass
+
+
+def decompress(data: bytes) -> bytes:
+    """yaz0.decompress, but the result is kept on disk keyed by the hash of the compressed bytes"""
+    if max_cache_bytes <= 0:
+        return bytes(yaz0.decompress(data))
+
+    key = hashlib.blake2b(data, digest_size=20).hexdigest()
+    cache_path = Path(f'{cache_directory}\\{key}.bin')
+    if cache_path.is_file():
+        try:
+            decompressed = cache_path.read_bytes()
+            # mtime doubles as the last used time for eviction
+            os.utime(cache_path)
+            return decompressed
+        except OSError:
+            # evicted between the check and the read
+            pass
+
+    decompressed = bytes(yaz0.decompress(data))
+    try:
+        if not Path(cache_directory).is_dir():
+            Path(cache_directory).mkdir(parents=True, exist_ok=True)
+        evict(len(decompressed))
+        # write to a temp file first so parallel readers never see half an entry
+        temp_path = Path(f'{cache_path}.{os.getpid()}.tmp')
+        temp_path.write_bytes(decompressed)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        print(f'could not cache decompressed {key}')
+    return decompressed
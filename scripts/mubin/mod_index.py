@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+index_directory = 'linked_resources\\json\\generated\\mod_indexes'
+INDEX_VERSION = 1
+
+loaded = {}
+"""mod folder: (Data.signature, merged model names), so each process lists a mod folder once"""
+
+
+def mod_folder_for(mubin_path) -> str:
+    """the mod folder a mubin belongs to (the parent of its content or aoc folder), or None"""
+    for parent in Path(os.path.abspath(mubin_path)).parents:
+        if parent.name.lower() in ('content', 'aoc'):
+            return str(parent.parent)
+    return None
+
+
+def read_actorpack(actorpack_path: str) -> dict:
+    """BfresName and ModelName from an actorpack's model list, top level so process pool workers can run it"""
+    from oead import Sarc, aamp
+    from .io.open_oead import OpenOead
+    try:
+        sarc = Sarc(OpenOead.decompressed_path(actorpack_path))
+        for file in sarc.get_files():
+            if not file.name.endswith('.bmodellist'):
+                continue
+            modellist = aamp.ParameterIO.from_binary(bytes(file.data))
+            model_data = modellist.lists["ModelData"].lists["ModelData_0"]
+            unit_name = model_data.lists["Unit"].objects["Unit_0"].params["UnitName"].v
+            folder_name = model_data.objects["Base"].params["Folder"].v
+            return {'BfresName': str(folder_name), 'ModelName': str(unit_name)}
+    except Exception as e:
+        print(f'could not read {actorpack_path}: {e}')
+    return {'BfresName': None, 'ModelName': None}
+
+
+class mod_index:
+    """
+    Actor name to model table for every actorpack in a mod's content\\Actor\\Pack.
+
+    The folder is listed once and only new or changed actorpacks are parsed,
+    so resolving a custom actor never touches the filesystem.
+    """
+
+    def __init__(self, mod_folder: str):
+        self.mod_folder = os.path.abspath(mod_folder)
+        self.actors: dict = {}
+        """actor name: size, mtime, BfresName, ModelName"""
+
+    def path(self) -> str:
+        key = hashlib.sha1(self.mod_folder.encode('utf-8')).hexdigest()[:8]
+        return f'{index_directory}\\{Path(self.mod_folder).name}_{key}.json'
+
+    def pack_directory(self) -> str:
+        return f'{self.mod_folder}\\content\\Actor\\Pack'
+
+    def load(mod_folder: str):
+        index = mod_index(mod_folder)
+        if Path(index.path()).is_file():
+            try:
+                data = json.loads(Path(index.path()).read_text())
+                if data.get('version') == INDEX_VERSION:
+                    index.actors = data['actors']
+            except Exception:
+                print(f'mod index for {mod_folder} unreadable, rebuilding')
+        return index
+
+    def save(self):
+        Path(index_directory).mkdir(parents=True, exist_ok=True)
+        # workers can update the same mod index, never leave half a file behind
+        temp_path = f'{self.path()}.{os.getpid()}.tmp'
+        Path(temp_path).write_text(json.dumps({'version': INDEX_VERSION, 'actors': self.actors}))
+        os.replace(temp_path, self.path())
+
+    def update(self, workers: int = None) -> bool:
+        """lists the actorpacks once and parses the new or changed ones, returns True if the index changed"""
+        found = {}
+        if Path(self.pack_directory()).is_dir():
+            for entry in os.scandir(self.pack_directory()):
+                if entry.is_file() and entry.name.endswith('.sbactorpack'):
+                    stat = entry.stat()
+                    found[entry.name[:-len('.sbactorpack')]] = (entry.path, stat.st_size, stat.st_mtime_ns)
+
+        changed = False
+        for name in list(self.actors.keys()):
+            if name not in found:
+                del self.actors[name]
+                changed = True
+
+        stale = {}
+        for name, (path, size, mtime) in found.items():
+            previous = self.actors.get(name)
+            if not previous or previous.get('size') != size or previous.get('mtime') != mtime:
+                stale[name] = (path, size, mtime)
+
+        if stale:
+            print(f'indexing {len(stale)} actorpacks in {self.mod_folder}')
+            paths = [path for path, _, _ in stale.values()]
+            if len(stale) > 8 and workers != 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    models = list(pool.map(read_actorpack, paths, chunksize=16))
+            else:
+                models = [read_actorpack(path) for path in paths]
+            for (name, (path, size, mtime)), model in zip(stale.items(), models):
+                self.actors[name] = {'size': size, 'mtime': mtime, **model}
+            changed = True
+        return changed
+
+    def model_names(self) -> dict:
+        return {name: actor['ModelName'] for name, actor in self.actors.items() if actor.get('ModelName')}
+
+
+def prepare(mubin_paths: list, workers: int = None) -> str:
+    """
+    updates the index of every mod folder the mubins are in, before they are handed to workers.
+    returns a digest of the mod actor models so caches made with other mod actors can be dropped
+    """
+    digest = hashlib.sha1()
+    for mod_folder in sorted({f for f in map(mod_folder_for, mubin_paths) if f}):
+        index = mod_index.load(mod_folder)
+        if index.update(workers):
+            index.save()
+        digest.update(json.dumps([mod_folder, sorted(index.model_names().items())]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def model_names_for(mubin_path) -> dict:
+    """Data.model_names plus the models of the mubin's mod actors, vanilla and cached actors take priority"""
+    from .io.data import Data
+    Data.init()
+    mod_folder = mod_folder_for(mubin_path)
+    if not mod_folder:
+        return Data.model_names
+    cached = loaded.get(mod_folder)
+    if cached and cached[0] == Data.signature:
+        return cached[1]
+
+    # prepare has normally indexed the mod already, this is one listing per process
+    index = mod_index.load(mod_folder)
+    if index.update(1):
+        index.save()
+    model_names = index.model_names()
+    model_names.update(Data.model_names)
+    loaded[mod_folder] = (Data.signature, model_names)
+    return model_names
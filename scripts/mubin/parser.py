@@ -3,126 +3,69 @@ import time
 from pathlib import Path
 import json
 from scripts.classes.instance_cache import instance_cache
+from scripts.mubin.transforms import transform_batch
+from scripts.mubin.actor_filter import actor_filter
 
 with open("mbconfig.json", "r") as f:
     config = json.load(f)
 
+worker_filter: actor_filter = None
+"""set once per pool worker by init_worker, so the filter isn't pickled with every mubin"""
 
-def parse_actor(actor: dict, mod_folder: str, cache={}, exported={}, data_dir='', p_cache: instance_cache = {}):
-    from .io.data import Data
+
+def parse_actor(actor: dict, model_names={}, batch: transform_batch = None, a_filter: actor_filter = None):
     """Imports a mubin actor entry using the cached models and relative sbfres files."""
 
     name = actor['UnitConfigName']
-    dae_file = ''
-
-    # Vanilla actor
-    if name in exported:
-        dae_file = f'{data_dir}\\collada\\{exported[name]["BfresName"]}\\{exported[name]["ModelName"]}.dae'
-
-    # Custom actor already cached
-    elif name in cache:
-        dae_file = f'{data_dir}\\cache\\{cache[name]["BfresName"]}\\{cache[name]["ModelName"]}.dae'
 
-    # Custom actor
-    elif Path(f'{mod_folder}\\content\\Actor\\Pack\\{name}.sbactorpack').is_file():
-        Data.cache_actor(Path(f'{mod_folder}\\content\\Actor\\Pack\\{name}.sbactorpack'))
-        dae_file = f'{data_dir}\\bin\\{cache[name]["BfresName"]}\\{cache[name]["ModelName"]}.dae'
+    # Vanilla actor, cached actor or custom actor from the mod index
+    model_name = model_names.get(name)
 
     # Actor not found
-    else:
+    if not model_name:
         # print(f'A model for {name}: {actor["HashId"]} could not be found.')
         return
 
-    model_name = Path(dae_file).stem
-
-    # Set the transform
-    location = actor['Translate']
-    rotate = [0, 0, 0]
-    scale = [1, 1, 1]
-
-    # Get rotation
-    if 'Rotate' in actor:
-        try:
-            rotate = [
-                actor['Rotate'][0],
-                actor['Rotate'][1],
-                actor['Rotate'][2],
-            ]
-        except:
-            rotate = [
-                0.0,
-                actor['Rotate'],
-                0.0,
-            ]
-
-    # Get scale
-    if 'Scale' in actor:
-        try:
-            scale = [
-                actor['Scale'][0],
-                actor['Scale'][2],
-                actor['Scale'][1],
-            ]
-        except:
-            scale = [
-                actor['Scale'],
-                actor['Scale'],
-                actor['Scale'],
-            ]
-
-    location = [float(l) for l in location]
-    rotate = [float(r) for r in rotate]
-    scale = [float(s) for s in scale]
-
-    model_position = instance_cache.position(location, rotate, scale)
-
-    if p_cache.models.get(model_name):
-        p_cache.models[model_name].positions.append(model_position)
-    else:
-        # cache by model name
-        p_cache.models[model_name] = instance_cache.model([model_position])
+    # e.g. only actors with a built asset
+    if a_filter and not a_filter.allows_model(model_name):
+        return
+
+    # raw transforms are collected per mubin and normalized together in batch.flush
+    hash_id = actor['HashId'] if 'HashId' in actor else 0
+    batch.add(model_name, hash_id, actor['Translate'], actor.get('Rotate'), actor.get('Scale'))
 
     # print(f'cached {name}: {actor["HashId"]} successfully.\n')
     return
 
 
-def parse_mubin(mubin: Path, import_far: bool, p_cache: instance_cache):
+def parse_mubin(mubin: Path, p_cache: instance_cache, a_filter: actor_filter = None):
     print(f'parse_mubin {mubin}')
     from .io.open_oead import OpenOead
-    from .io.data import Data
-    Data.init()
+    from .io.byml_stream import BymlStream
+    from .mod_index import model_names_for
     data_dir = config["dataDir"]
-    cache = Data.cache
-    exported = Data.exported
-    data = OpenOead.from_path(mubin)
+    # the mod's actorpacks are indexed up front, custom actors resolve like vanilla ones
+    model_names = model_names_for(mubin)
+    # only the fields parse_actor needs are read, the rest of the BYML tree is skipped
+    data = BymlStream(OpenOead.decompressed_path(mubin))
 
     if not p_cache:
         print('no parse cache?')
         return
 
-    content = ''
-    num = range(0)
-    # find the content directory which should be part of the mubin's path
-    for i in num:
-        if Path(f'{mubin}{".//" * (i + 1)}/content').is_dir():
-            content = f'{mubin}{"..//" * (i + 1)}/content'
-            break
+    # the filter decides _Far actors too, see actorFilter far in mbconfig.json
+    if a_filter is None:
+        a_filter = worker_filter or actor_filter.from_config()
 
-        num = range(i + 1)
-
-    if data.type == 'BYML' and data.sub_type == 'MUBIN':
+    if data.is_mubin():
         start_time = time.time()
-        for actor in data.content['Objs']:
+        batch = transform_batch()
+        # filtered out actors are skipped before their transforms are even decoded
+        for actor in data.iter_projected('Objs', name_filter=a_filter.allows_name):
             # print(f'name:{actor["UnitConfigName"]} hashid:{actor["HashId"]}')
             try:
-                if str(actor["UnitConfigName"]).endswith('_Far') and import_far:
-                    # Import actor
-                    parse_actor(actor, f'{content}..\\', cache=cache, exported=exported,
-                                 data_dir=data_dir, p_cache=p_cache)
-                else:
-                    # Import actor
-                    parse_actor(actor, f'{content}..\\', cache=cache, exported=exported,
-                                 data_dir=data_dir, p_cache=p_cache)
+                # Import actor
+                parse_actor(actor, model_names=model_names, batch=batch, a_filter=a_filter)
             except:
                 # print(f'Could not cache {actor["UnitConfigName"]}\n{traceback.format_exc()}')
 
@@ -133,12 +76,26 @@ def parse_mubin(mubin: Path, import_far: bool, p_cache: instance_cache):
                 Path(f'{data_dir}\\error.txt').write_text(
                     f'{error}Could not cache {actor["UnitConfigName"]}\n{traceback.format_exc()}{"- " * 30}\n')
 
+        batch.flush(p_cache)
         end_time = time.time()
         sec = end_time - start_time
         print(f'\nCompleted in {sec} seconds.')
     return
 
 
+def init_worker(spec: dict, built_assets: set = None):
+    # ProcessPoolExecutor initializer, the built asset set is sent once per worker instead of once per mubin
+    global worker_filter
+    worker_filter = actor_filter(spec, built_assets)
+
+
+def cache_mubin(mubin_path: str, a_filter: actor_filter = None):
+    # top level so it can be pickled and sent to a ProcessPoolExecutor worker
+    p_cache = instance_cache()
+    parse_mubin(Path(mubin_path), p_cache, a_filter)
+    return Path(mubin_path).stem, p_cache
+
+
 def main():
     print('importer main')
     return
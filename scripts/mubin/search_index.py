@@ -0,0 +1,171 @@
+import os
+import pickle
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from scripts.mubin.cache_manifest import file_entry
+
+index_path = 'linked_resources\\json\\generated\\search_index.pickle'
+INDEX_VERSION = 1
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def scan_mubin(mubin_path: str) -> list:
+    """(actor name, HashId, location) for every Obj, top level so process pool workers can run it"""
+    from scripts.mubin.io.open_oead import OpenOead
+    from scripts.mubin.io.byml_stream import BymlStream
+    data = BymlStream(OpenOead.decompressed_path(mubin_path))
+    actors = []
+    if not data.is_mubin():
+        return actors
+    for actor in data.iter_projected('Objs', ('UnitConfigName', 'HashId', 'Translate')):
+        if 'UnitConfigName' not in actor:
+            continue
+        location = tuple(actor.get('Translate', (0, 0, 0)))
+        actors.append((actor['UnitConfigName'], actor.get('HashId', 0), location))
+    return actors
+
+
+class search_index:
+    """
+    Inverted index of actor names (and the model names they resolve to) to their placements.
+
+    Substring search goes through a trigram index of the lowercase names, so a search never
+    has to open a mubin. Mubins are rescanned only when they change.
+    """
+
+    def __init__(self):
+        self.mubins: dict = {}
+        """absolute mubin path: size, mtime, hash"""
+        self.postings: dict = {}
+        """actor name: {mubin path: [(HashId, location), ...]}"""
+        self.mubin_actors: dict = {}
+        """mubin path: actor names in it, to drop its postings when it changes"""
+        self.model_names: dict = {}
+        """actor name: model name"""
+        self.trigrams: dict = {}
+        """trigram: set of lowercase names containing it"""
+        self.lookup: dict = {}
+        """lowercase name: actor names it matches (the actor itself, or every actor using a model)"""
+
+    def load():
+        if Path(index_path).is_file():
+            try:
+                with open(index_path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    index = search_index()
+                    index.__dict__.update(data['index'])
+                    return index
+            except Exception:
+                print('search index unreadable, rebuilding')
+        return search_index()
+
+    def save(self):
+        with open(index_path, 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'index': self.__dict__}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def remove_mubin(self, mubin_path: str):
+        for name in self.mubin_actors.pop(mubin_path, ()):
+            postings = self.postings.get(name)
+            if postings is None:
+                continue
+            postings.pop(mubin_path, None)
+            if not postings:
+                del self.postings[name]
+        self.mubins.pop(mubin_path, None)
+
+    def add_mubin(self, mubin_path: str, entry: dict, actors: list):
+        self.remove_mubin(mubin_path)
+        for name, hash_id, location in actors:
+            self.postings.setdefault(name, {}).setdefault(mubin_path, []).append((hash_id, location))
+        self.mubin_actors[mubin_path] = {name for name, _, _ in actors}
+        self.mubins[mubin_path] = entry
+
+    def update(self, directory: str, mubin_paths: list, workers: int = None) -> bool:
+        """rescans new or changed mubins under directory, returns True if the index changed"""
+        from scripts.mubin.io.data import Data
+        directory = os.path.abspath(directory)
+        mubin_paths = [os.path.abspath(p) for p in mubin_paths]
+
+        # drop mubins that were deleted from this directory, the separator keeps out siblings like MainFieldOld
+        directory_prefix = os.path.join(directory, '')
+        found = set(mubin_paths)
+        removed = 0
+        for mubin_path in list(self.mubins.keys()):
+            if mubin_path.startswith(directory_prefix) and mubin_path not in found:
+                self.remove_mubin(mubin_path)
+                removed += 1
+
+        stale = {}
+        for mubin_path in mubin_paths:
+            previous = self.mubins.get(mubin_path)
+            entry = file_entry(mubin_path, previous)
+            if not previous or entry['hash'] != previous.get('hash'):
+                stale[mubin_path] = entry
+            else:
+                previous.update(entry)
+
+        if stale:
+            print(f'indexing {len(stale)} mubins')
+            if len(stale) > 8:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    for mubin_path, actors in zip(stale, pool.map(scan_mubin, stale, chunksize=8)):
+                        self.add_mubin(mubin_path, stale[mubin_path], actors)
+            else:
+                for mubin_path in stale:
+                    self.add_mubin(mubin_path, stale[mubin_path], scan_mubin(mubin_path))
+
+        # model names can change with exported.json / cache.json even if no mubin did
+        Data.init()
+        model_names = {name: Data.model_names[name] for name in self.postings if name in Data.model_names}
+        if stale or removed or model_names != self.model_names or not self.lookup:
+            self.model_names = model_names
+            self.build_trigrams()
+            return True
+        return False
+
+    def build_trigrams(self):
+        lookup = {}
+        for name in self.postings:
+            lookup.setdefault(name.lower(), set()).add(name)
+        for name, model_name in self.model_names.items():
+            lookup.setdefault(model_name.lower(), set()).add(name)
+        index = {}
+        for text in lookup:
+            for trigram in trigrams(text):
+                index.setdefault(trigram, set()).add(text)
+        self.lookup = lookup
+        self.trigrams = index
+
+    def search(self, text: str) -> list:
+        """case insensitive substring search over actor and model names"""
+        text = text.strip().lower()
+        if not text:
+            return []
+        if len(text) < 3:
+            candidates = self.lookup.keys()
+        else:
+            # every trigram of the search has to be in a match, start with the rarest
+            sets = sorted((self.trigrams.get(t, set()) for t in trigrams(text)), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:]) if sets else set()
+
+        actor_names = set()
+        for candidate in candidates:
+            if text in candidate:
+                actor_names.update(self.lookup[candidate])
+
+        hits = []
+        for name in sorted(actor_names):
+            for mubin_path, placements in self.postings.get(name, {}).items():
+                for hash_id, location in placements:
+                    hits.append({
+                        'mubin': mubin_path,
+                        'name': name,
+                        'model': self.model_names.get(name),
+                        'HashId': hash_id,
+                        'location': location,
+                    })
+        return hits
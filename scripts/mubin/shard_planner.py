@@ -0,0 +1,88 @@
+import os
+import json
+import heapq
+from pathlib import Path
+from scripts.mubin.dedup import section_of
+
+shard_manifest_path = 'linked_resources\\json\\generated\\instance_caches\\shard_manifest.json'
+shard_blend_directory = 'asset_library\\mubins_by_shard'
+
+MODEL_WEIGHT = 25.0
+"""linking a model's asset costs about as much as instancing this many placements"""
+
+
+def mubin_cost(p_cache) -> float:
+    placements = sum(len(model) for model in p_cache.models.values())
+    return placements + MODEL_WEIGHT * len(p_cache.models)
+
+
+def section_costs(p_caches: dict) -> dict:
+    """{section: [cost, [stems]]}, a section's _Static and _Dynamic mubins always go to the same shard"""
+    sections = {}
+    for stem, p_cache in p_caches.items():
+        section = sections.setdefault(section_of(stem), [0.0, []])
+        section[0] += mubin_cost(p_cache)
+        section[1].append(stem)
+    return sections
+
+
+def plan_shards(p_caches: dict, shard_count: int) -> list:
+    """
+    spreads the sections over shard_count shards so each Blender child gets about the same work.
+    longest processing time first, the most expensive section goes to the least loaded shard
+    """
+    sections = section_costs(p_caches)
+    shard_count = max(1, min(shard_count, len(sections)))
+    shards = [{'name': f'shard_{i:02}', 'cost': 0.0, 'sections': [], 'mubins': []} for i in range(shard_count)]
+    heap = [(0.0, i) for i in range(shard_count)]
+    for section, (cost, stems) in sorted(sections.items(), key=lambda x: (-x[1][0], x[0])):
+        load, i = heapq.heappop(heap)
+        shard = shards[i]
+        shard['cost'] += cost
+        shard['sections'].append(section)
+        shard['mubins'] += stems
+        heapq.heappush(heap, (shard['cost'], i))
+    return [shard for shard in shards if shard['mubins']]
+
+
+def shard_blend_path(shard_name: str) -> str:
+    return f'{shard_blend_directory}\\{shard_name}.blend'
+
+
+def clear_stale_shards(shards: list):
+    """makes sure the shard blends have somewhere to go and drops the blends and caches of shards no longer planned"""
+    Path(shard_blend_directory).mkdir(parents=True, exist_ok=True)
+    names = {shard['name'] for shard in shards}
+    cache_directory = os.path.dirname(shard_manifest_path)
+    stale = []
+    for entry in os.scandir(shard_blend_directory):
+        if entry.name.startswith('shard_') and entry.name.endswith('.blend') and entry.name[:-6] not in names:
+            stale.append(entry.path)
+    if os.path.isdir(cache_directory):
+        for entry in os.scandir(cache_directory):
+            suffix = '_instance_cache.bin'
+            if entry.name.startswith('shard_') and entry.name.endswith(suffix) and entry.name[:-len(suffix)] not in names:
+                stale.append(entry.path)
+    for path in stale:
+        print(f'removing stale shard file {path}')
+        os.remove(path)
+
+
+def write_shard_manifest(shards: list, path: str = shard_manifest_path) -> dict:
+    """the helper's import_shard reads its shard from here, sections maps each section to the blend it ends up in"""
+    clear_stale_shards(shards)
+    manifest = {
+        'shards': {shard['name']: shard for shard in shards},
+        'sections': {},
+    }
+    for shard in shards:
+        for section in shard['sections']:
+            manifest['sections'][section] = os.path.abspath(shard_blend_path(shard['name']))
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def load_shard_manifest(path: str = shard_manifest_path) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
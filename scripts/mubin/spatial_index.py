@@ -0,0 +1,218 @@
+import os
+import json
+from pathlib import Path
+import numpy as np
+from scripts.classes.instance_cache import instance_cache
+from scripts.classes.instance_cache import instance_cache_reader
+
+instance_cache_directory = 'linked_resources\\json\\generated\\instance_caches'
+index_path = 'linked_resources\\json\\generated\\spatial_index.npz'
+region_cache_prefix = 'region'
+"""import_region writes its placements to region_instance_cache.bin"""
+INDEX_VERSION = 1
+CELL_SIZE = 64.0
+# cell coordinates are offset so negative map coordinates still fit in 16 bits
+CELL_OFFSET = 1 << 15
+
+
+def spread_bits(n: np.ndarray) -> np.ndarray:
+    """spaces the low 16 bits out so another coordinate can be interleaved between them"""
+    n = n.astype(np.uint32) & 0x0000FFFF
+    n = (n | (n << 8)) & 0x00FF00FF
+    n = (n | (n << 4)) & 0x0F0F0F0F
+    n = (n | (n << 2)) & 0x33333333
+    n = (n | (n << 1)) & 0x55555555
+    return n
+
+
+def cell_coords(values: np.ndarray, cell_size: float) -> np.ndarray:
+    cells = np.floor(np.asarray(values, dtype=np.float64) / cell_size).astype(np.int64) + CELL_OFFSET
+    return np.clip(cells, 0, 0xFFFF)
+
+
+def morton_codes(cx: np.ndarray, cz: np.ndarray) -> np.ndarray:
+    """Z order codes so placements that are close on the map are close in the index"""
+    return spread_bits(cx) | (spread_bits(cz) << 1)
+
+
+def instance_cache_files() -> list:
+    if not Path(instance_cache_directory).is_dir():
+        return []
+    paths = []
+    for entry in os.scandir(instance_cache_directory):
+        if not entry.is_file() or not entry.name.endswith('_instance_cache.bin'):
+            continue
+        # shards and regions are only other cuts of the same placements
+        if entry.name.startswith('shard_') or entry.name == f'{region_cache_prefix}_instance_cache.bin':
+            continue
+        paths.append(os.path.abspath(entry.path))
+    # prefix caches first, the selected mubins cache (no prefix) only fills in what they don't have
+    return sorted(paths, key=lambda p: (Path(p).name.startswith('_'), p))
+
+
+def source_signature(paths: list) -> list:
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([path, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+class spatial_index:
+    """
+    Grid index over every cached placement on the map's X/Z plane.
+
+    Placements are sorted by the Morton code of their grid cell, so a query only has to
+    binary search the cells it overlaps and then check the placements inside them.
+    """
+
+    def __init__(self):
+        self.cell_size = CELL_SIZE
+        self.codes = np.empty(0, dtype=np.uint32)
+        self.transforms = np.empty((0, instance_cache.model.width), dtype=np.float32)
+        self.hash_ids = np.empty(0, dtype=np.uint32)
+        self.model_ids = np.empty(0, dtype=np.uint32)
+        self.mubin_ids = np.empty(0, dtype=np.uint32)
+        self.model_names: list = []
+        self.mubin_names: list = []
+        self.signature: list = []
+
+    def __len__(self):
+        return len(self.hash_ids)
+
+    def build(cache_paths: list = None, cell_size: float = CELL_SIZE):
+        if cache_paths is None:
+            cache_paths = instance_cache_files()
+        index = spatial_index()
+        index.cell_size = cell_size
+        index.signature = source_signature(cache_paths)
+
+        model_lookup = {}
+        mubins_seen = set()
+        transforms = []
+        hash_ids = []
+        model_ids = []
+        mubin_ids = []
+        for cache_path in cache_paths:
+            with instance_cache_reader(cache_path) as reader:
+                for mubin in reader.mubins():
+                    # the same mubin can be in a prefix cache and the selected mubins cache
+                    if mubin in mubins_seen:
+                        continue
+                    mubins_seen.add(mubin)
+                    mubin_id = len(index.mubin_names)
+                    index.mubin_names.append(mubin)
+                    for model_name in reader.models(mubin):
+                        model = reader.get_model(mubin, model_name)
+                        if model_name not in model_lookup:
+                            model_lookup[model_name] = len(index.model_names)
+                            index.model_names.append(model_name)
+                        transforms.append(model.get_transforms())
+                        hash_ids.append(model.get_hash_ids())
+                        model_ids.append(np.full(len(model), model_lookup[model_name], dtype=np.uint32))
+                        mubin_ids.append(np.full(len(model), mubin_id, dtype=np.uint32))
+
+        if not transforms:
+            return index
+        transforms = np.concatenate(transforms)
+        codes = morton_codes(cell_coords(transforms[:, 0], cell_size), cell_coords(transforms[:, 2], cell_size))
+        order = np.argsort(codes, kind='stable')
+        index.codes = codes[order]
+        index.transforms = transforms[order]
+        index.hash_ids = np.concatenate(hash_ids)[order]
+        index.model_ids = np.concatenate(model_ids)[order]
+        index.mubin_ids = np.concatenate(mubin_ids)[order]
+        return index
+
+    def save(self, path: str = index_path):
+        meta = {
+            'version': INDEX_VERSION,
+            'cell_size': self.cell_size,
+            'signature': self.signature,
+            'model_names': self.model_names,
+            'mubin_names': self.mubin_names,
+        }
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                codes=self.codes,
+                transforms=self.transforms,
+                hash_ids=self.hash_ids,
+                model_ids=self.model_ids,
+                mubin_ids=self.mubin_ids,
+            )
+            f.close()
+
+    def load(path: str = index_path):
+        """loads the saved index, rebuilding it if any instance cache changed since it was saved"""
+        if Path(path).is_file():
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                cache_paths = instance_cache_files()
+                if meta.get('version') == INDEX_VERSION and meta.get('signature') == source_signature(cache_paths):
+                    index = spatial_index()
+                    index.cell_size = meta['cell_size']
+                    index.signature = meta['signature']
+                    index.model_names = meta['model_names']
+                    index.mubin_names = meta['mubin_names']
+                    index.codes = data['codes']
+                    index.transforms = data['transforms']
+                    index.hash_ids = data['hash_ids']
+                    index.model_ids = data['model_ids']
+                    index.mubin_ids = data['mubin_ids']
+                    return index
+        print('building spatial index')
+        index = spatial_index.build()
+        index.save(path)
+        return index
+
+    def candidates(self, min_x: float, min_z: float, max_x: float, max_z: float) -> np.ndarray:
+        """indices of every placement in the cells the box overlaps"""
+        cx = np.arange(cell_coords(min_x, self.cell_size), cell_coords(max_x, self.cell_size) + 1)
+        cz = np.arange(cell_coords(min_z, self.cell_size), cell_coords(max_z, self.cell_size) + 1)
+        grid_x, grid_z = np.meshgrid(cx, cz)
+        cells = np.unique(morton_codes(grid_x.ravel(), grid_z.ravel()))
+        starts = np.searchsorted(self.codes, cells, side='left')
+        ends = np.searchsorted(self.codes, cells, side='right')
+        hits = ends > starts
+        if not hits.any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts[hits], ends[hits])])
+
+    def query_box(self, min_x: float, min_z: float, max_x: float, max_z: float,
+                  min_y: float = None, max_y: float = None) -> np.ndarray:
+        """indices of placements inside the box, in map coordinates (Y is height)"""
+        indices = self.candidates(min_x, min_z, max_x, max_z)
+        location = self.transforms[indices, 0:3]
+        inside = (location[:, 0] >= min_x) & (location[:, 0] <= max_x) & \
+            (location[:, 2] >= min_z) & (location[:, 2] <= max_z)
+        if min_y is not None:
+            inside &= location[:, 1] >= min_y
+        if max_y is not None:
+            inside &= location[:, 1] <= max_y
+        return indices[inside]
+
+    def query_radius(self, x: float, z: float, radius: float) -> np.ndarray:
+        """indices of placements within radius of x, z on the map"""
+        indices = self.candidates(x - radius, z - radius, x + radius, z + radius)
+        location = self.transforms[indices]
+        distance_sq = (location[:, 0] - x) ** 2 + (location[:, 2] - z) ** 2
+        return indices[distance_sq <= radius * radius]
+
+    def batches(self, indices: np.ndarray) -> dict:
+        """{mubin name: instance_cache} for the given placements, ready to write as an instance cache"""
+        p_caches = {}
+        if not len(indices):
+            return p_caches
+        # keep placements grouped the way the importer expects, mubin then model
+        indices = indices[np.lexsort((indices, self.model_ids[indices], self.mubin_ids[indices]))]
+        keys = np.stack((self.mubin_ids[indices], self.model_ids[indices]), axis=1)
+        splits = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        for group in np.split(indices, splits):
+            mubin = self.mubin_names[self.mubin_ids[group[0]]]
+            model_name = self.model_names[self.model_ids[group[0]]]
+            if mubin not in p_caches:
+                p_caches[mubin] = instance_cache()
+            p_caches[mubin].extend(model_name, self.hash_ids[group], self.transforms[group])
+        return p_caches
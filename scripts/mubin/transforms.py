@@ -0,0 +1,98 @@
+import numpy as np
+from scripts.classes.instance_cache import instance_cache
+
+
+def is_vector(value) -> bool:
+    return isinstance(value, (list, tuple))
+
+
+class transform_batch:
+    """
+    Collects the raw Translate / Rotate / Scale of every actor in a mubin,
+    then normalizes them into float32 transforms in one numpy pass.
+    """
+
+    def __init__(self):
+        self.model_rows: dict[str, list] = {}
+        """model name: row indices, in the order the actors were found"""
+        self.hash_ids = []
+        self.translates = []
+        self.rotates = []
+        self.rotate_scalar = []
+        """Rotate was a single value, it's the Y rotation"""
+        self.scales = []
+        self.scale_vector = []
+        """Scale was xyz, it needs the Y/Z swap"""
+
+    def __len__(self):
+        return len(self.hash_ids)
+
+    def add(self, model_name: str, hash_id: int, translate, rotate=None, scale=None):
+        if not is_vector(translate) or len(translate) != 3:
+            raise ValueError(f'Translate should have 3 values, got {translate}')
+
+        if rotate is None:
+            rotate = (0, 0, 0)
+            rotate_scalar = False
+        elif is_vector(rotate):
+            if len(rotate) != 3:
+                raise ValueError(f'Rotate should have 1 or 3 values, got {rotate}')
+            rotate_scalar = False
+        else:
+            rotate = (rotate, rotate, rotate)
+            rotate_scalar = True
+
+        if scale is None:
+            scale = (1, 1, 1)
+            scale_vector = False
+        elif is_vector(scale):
+            if len(scale) != 3:
+                raise ValueError(f'Scale should have 1 or 3 values, got {scale}')
+            scale_vector = True
+        else:
+            scale = (scale, scale, scale)
+            scale_vector = False
+
+        row = len(self.hash_ids)
+        rows = self.model_rows.get(model_name)
+        if rows is None:
+            rows = self.model_rows[model_name] = []
+        rows.append(row)
+        self.hash_ids.append(hash_id)
+        self.translates.append(translate)
+        self.rotates.append(rotate)
+        self.rotate_scalar.append(rotate_scalar)
+        self.scales.append(scale)
+        self.scale_vector.append(scale_vector)
+
+    def normalize(self) -> np.ndarray:
+        """(n, 9) float32 of location, rotate, scale for every added actor"""
+        count = len(self.hash_ids)
+        transforms = np.empty((count, instance_cache.model.width), dtype=np.float32)
+        if not count:
+            return transforms
+        transforms[:, 0:3] = np.asarray(self.translates, dtype=np.float32)
+
+        rotates = np.asarray(self.rotates, dtype=np.float32)
+        # a single Rotate value is the Y rotation
+        rotate_scalar = np.asarray(self.rotate_scalar, dtype=bool)
+        rotates[rotate_scalar, 0] = 0
+        rotates[rotate_scalar, 2] = 0
+        transforms[:, 3:6] = rotates
+
+        scales = np.asarray(self.scales, dtype=np.float32)
+        # mubin scale is xzy relative to blender's local axes
+        scale_vector = np.asarray(self.scale_vector, dtype=bool)
+        scales[scale_vector] = scales[scale_vector][:, [0, 2, 1]]
+        transforms[:, 6:9] = scales
+        return transforms
+
+    def flush(self, p_cache: instance_cache):
+        """normalizes everything collected and adds it to the instance cache by model"""
+        if not self.hash_ids:
+            return
+        transforms = self.normalize()
+        hash_ids = np.asarray(self.hash_ids, dtype=np.uint32)
+        for model_name, rows in self.model_rows.items():
+            p_cache.extend(model_name, hash_ids[rows], transforms[rows])
+        self.__init__()